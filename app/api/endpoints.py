@@ -1,18 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, Request
-from fastapi.responses import HTMLResponse
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-import json
-from datetime import datetime
+import re
+from datetime import datetime, timedelta, timezone
 
-from app.database import crud, session
+from app.database import async_crud, crud, session
 from app.services.weather_service import weather_service
+from app.services.cache import trends_cache
+from app.services.analytics import ANALYTICS_METRICS, get_analytics, compare_cities
+from app.services.downsampling import downsample_columns, downsample_records
+from app.services.export import EXPORT_FORMATS, parquet_available, stream_weather_export
+from app.core.utils import encode_cursor, decode_cursor, normalize_city, dumps_json
 from app.schemas.weather import WeatherResponse
 from app.core.config import settings
-from fastapi.templating import Jinja2Templates
 
 router = APIRouter()
-templates = Jinja2Templates(directory="app/templates")
 
 # ========== API ENDPOINTS ==========
 
@@ -20,65 +23,175 @@ templates = Jinja2Templates(directory="app/templates")
 async def get_current_weather(
     city: str = Query(..., example="São Paulo"),
     country: Optional[str] = Query(None, example="BR"),
-    db: Session = Depends(session.get_db)
+    db: AsyncSession = Depends(session.get_async_db)
 ):
     try:
-        weather_data = weather_service.get_current_weather(city, country)
-        db_record = crud.create_weather_record(db, weather_data)
+        weather_data = await weather_service.get_current_weather(city, country)
+        db_record = await async_crud.create_weather_record(db, weather_data)
         return db_record
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/api/weather/history", response_model=List[WeatherResponse])
 async def get_weather_history(
+    response: Response,
     city: Optional[str] = Query(None),
-    limit: int = Query(50, ge=1, le=1000),
-    db: Session = Depends(session.get_db)
+    limit: int = Query(50, ge=1, le=settings.HISTORY_COLUMNAR_MAX_LIMIT),
+    match: str = Query("prefix", pattern="^(exact|prefix|fuzzy)$"),
+    cursor: Optional[str] = Query(None, description="Valor de X-Next-Cursor da página anterior"),
+    format: str = Query("rows", pattern="^(rows|columnar)$"),
+    fields: Optional[str] = Query(None, description="Campos do formato colunar, separados por vírgula"),
+    points: Optional[int] = Query(None, ge=10, le=10000, description="Máximo de pontos (formato colunar)"),
+    downsample: str = Query("lttb", pattern="^(lttb|minmax)$"),
+    db: AsyncSession = Depends(session.get_async_db)
 ):
-    records = crud.get_weather_records(db, city=city, limit=limit)
+    try:
+        before = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if format == "columnar":
+        return await _columnar_history(city, limit, match, before, fields, points, downsample, db)
+    if limit > settings.HISTORY_MAX_LIMIT:
+        raise HTTPException(status_code=422, detail=f"limit máximo no formato rows é {settings.HISTORY_MAX_LIMIT}")
+    
+    records = await async_crud.get_weather_records(db, city=city, limit=limit, match=match, before=before)
+    if len(records) == limit:
+        # Próxima página: registros anteriores ao último desta
+        response.headers["X-Next-Cursor"] = encode_cursor(records[-1].timestamp, records[-1].id)
     return records
 
-@router.get("/api/weather/cities")
-async def get_cities(db: Session = Depends(session.get_db)):
-    return crud.get_cities_with_records(db)
+async def _columnar_history(city, limit, match, before, fields, points, downsample, db) -> Response:
+    """Histórico em colunas: uma lista por campo, sem validação por linha"""
+    selected = [f.strip() for f in fields.split(",") if f.strip()] if fields else crud.COLUMNAR_FIELDS
+    invalid = set(selected) - set(crud.COLUMNAR_FIELDS)
+    if invalid:
+        raise HTTPException(status_code=422, detail=f"Campos inválidos: {', '.join(sorted(invalid))}")
+    
+    columns = await async_crud.get_weather_columns(db, city=city, limit=limit, match=match, before=before, fields=selected)
+    headers = {}
+    if len(columns["id"]) == limit:
+        headers["X-Next-Cursor"] = encode_cursor(columns["timestamp"][-1], columns["id"][-1])
+    if points:
+        # A série do primeiro campo pedido decide quais pontos ficam
+        columns = downsample_columns(columns, points, y_key=selected[0], method=downsample)
+    return Response(
+        content=dumps_json({"count": len(columns["id"]), **columns}),
+        media_type="application/json",
+        headers=headers
+    )
+
+@router.get("/api/weather/export")
+async def export_weather_history(
+    city: Optional[str] = Query(None),
+    start: Optional[datetime] = Query(None),
+    end: Optional[datetime] = Query(None),
+    format: str = Query("ndjson", pattern="^(ndjson|csv|parquet)$"),
+    match: str = Query("exact", pattern="^(exact|prefix|fuzzy)$")
+):
+    """Exportação completa do histórico, gerada em streaming"""
+    if format == "parquet" and not parquet_available():
+        raise HTTPException(status_code=501, detail="Exportação parquet requer pyarrow instalado")
+    
+    filename = re.sub(r"[^a-z0-9_-]+", "_", normalize_city(city or "all"))
+    return StreamingResponse(
+        stream_weather_export(format, city=city, start=start, end=end, match=match),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="weather_{filename}.{format}"'}
+    )
+
+@router.get("/api/weather/trends")
+async def get_weather_trends(
+    city: str = Query(..., example="São Paulo"),
+    start: Optional[datetime] = Query(None, description="Início (padrão: 7 dias atrás)"),
+    end: Optional[datetime] = Query(None, description="Fim (padrão: próxima hora cheia)"),
+    granularity: str = Query("auto", pattern="^(auto|hour|day)$"),
+    country: Optional[str] = Query(None),
+    points: Optional[int] = Query(None, ge=10, le=10000, description="Máximo de pontos na resposta"),
+    downsample: str = Query("lttb", pattern="^(lttb|minmax)$"),
+    db: AsyncSession = Depends(session.get_async_db)
+):
+    """Tendências a partir dos agregados horários/diários (sem ler linhas brutas)
+
+    Datas sem fuso são tratadas como UTC. O fim padrão é a próxima hora
+    cheia, para que a chave do cache não mude a cada requisição.
+    """
+    end = crud.as_utc(end) if end else crud.hour_bucket(datetime.now(timezone.utc)) + timedelta(hours=1)
+    start = crud.as_utc(start) if start else end - timedelta(days=7)
+    if start >= end:
+        raise HTTPException(status_code=422, detail="start deve ser anterior a end")
+    if granularity == "auto":
+        granularity = "hour" if end - start <= timedelta(days=settings.TRENDS_HOURLY_MAX_DAYS) else "day"
+    
+    key = (normalize_city(city), (country or "").upper(), start, end, granularity, await async_crud.get_city_version(db, city))
+    rollups = await trends_cache.get(key)
+    if rollups is None:
+        rollups = [r.to_dict() for r in await async_crud.get_rollups(db, city, start, end, granularity=granularity, country=country)]
+        await trends_cache.set(key, rollups)
+    if points:
+        rollups = downsample_records(rollups, points, value=lambda r: r["temperature"]["mean"], method=downsample)
+    return {
+        "city": city,
+        "granularity": granularity,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "points": rollups
+    }
 
-# ========== FRONTEND ENDPOINTS ==========
+ANALYTICS_FIELDS = "^(temperature|feels_like|humidity|pressure|wind_speed)$"
 
-@router.get("/", response_class=HTMLResponse)
-async def home(request: Request):
-    return templates.TemplateResponse("index.html", {
-        "request": request,
-        "app_name": settings.APP_NAME
-    })
+def _analytics_range(start: Optional[datetime], end: Optional[datetime]):
+    """Intervalo das análises; o fim padrão é a próxima hora cheia (chave estável no cache)
 
-@router.get("/dashboard", response_class=HTMLResponse)
-async def dashboard(
-    request: Request,
-    city: str = Query("São Paulo"),
-    db: Session = Depends(session.get_db)
+    Datas sem fuso são tratadas como UTC.
+    """
+    end = crud.as_utc(end) if end else crud.hour_bucket(datetime.now(timezone.utc)) + timedelta(hours=1)
+    start = crud.as_utc(start) if start else end - timedelta(days=7)
+    if start >= end:
+        raise HTTPException(status_code=422, detail="start deve ser anterior a end")
+    if end - start > timedelta(days=settings.ANALYTICS_MAX_DAYS):
+        raise HTTPException(status_code=422, detail=f"Intervalo máximo de {settings.ANALYTICS_MAX_DAYS} dias")
+    return start, end
+
+@router.get("/api/weather/analytics/compare")
+async def get_weather_comparison(
+    cities: str = Query(..., description="Cidades separadas por vírgula", example="São Paulo,Lisboa"),
+    field: str = Query("temperature", pattern=ANALYTICS_FIELDS),
+    start: Optional[datetime] = Query(None, description="Início (padrão: 7 dias antes do fim)"),
+    end: Optional[datetime] = Query(None, description="Fim (padrão: próxima hora cheia)"),
+    resample: str = Query("1h", pattern="^[1-9][0-9]*(min|h|D)$"),
+    db: AsyncSession = Depends(session.get_async_db)
 ):
-    try:
-        current_data = weather_service.get_current_weather(city)
-        crud.create_weather_record(db, current_data)
-        
-        history = crud.get_weather_records(db, city=city, limit=20)
-        
-        chart_data = {
-            "dates": [r.timestamp.strftime("%H:%M") for r in history],
-            "temperatures": [r.temperature for r in history],
-            "humidities": [r.humidity for r in history]
-        }
-        
-        return templates.TemplateResponse("dashboard.html", {
-            "request": request,
-            "app_name": settings.APP_NAME,
-            "city": city,
-            "current_data": current_data,
-            "chart_data": json.dumps(chart_data),
-            "has_real_data": current_data.get("source") == "openweathermap",
-            "api_key_configured": bool(settings.OPENWEATHER_API_KEY and settings.OPENWEATHER_API_KEY != "test_key"),
-            "timestamp": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
-        })
-        
-    except Exception as e:
-        return f"<h1>Erro</h1><p>{str(e)}</p>"
\ No newline at end of file
+    """Compara cidades no mesmo eixo de tempo (médias por período, resumo e correlação)"""
+    names = list(dict.fromkeys(c.strip() for c in cities.split(",") if c.strip()))
+    if not 2 <= len(names) <= settings.ANALYTICS_MAX_CITIES:
+        raise HTTPException(status_code=422, detail=f"Informe de 2 a {settings.ANALYTICS_MAX_CITIES} cidades")
+    start, end = _analytics_range(start, end)
+    result = await compare_cities(db, names, start, end, field=field, resample=resample)
+    return Response(dumps_json({"start": start, "end": end, **result}), media_type="application/json")
+
+@router.get("/api/weather/analytics/{metric}")
+async def get_weather_analytics(
+    metric: str,
+    city: str = Query(..., example="São Paulo"),
+    field: str = Query("temperature", pattern=ANALYTICS_FIELDS),
+    start: Optional[datetime] = Query(None, description="Início (padrão: 7 dias antes do fim)"),
+    end: Optional[datetime] = Query(None, description="Fim (padrão: próxima hora cheia)"),
+    window: str = Query("3h", pattern="^[1-9][0-9]*(min|h|D)$", description="Janela da média móvel"),
+    threshold: float = Query(3.0, gt=0, description="|z-score| para marcar anomalia"),
+    db: AsyncSession = Depends(session.get_async_db)
+):
+    """Média móvel, variação diária, anomalias (z-score) ou índice de calor"""
+    if metric not in ANALYTICS_METRICS:
+        raise HTTPException(status_code=404, detail=f"Métrica inválida. Use: {', '.join(ANALYTICS_METRICS)}")
+    start, end = _analytics_range(start, end)
+    result = await get_analytics(db, city, start, end, metric, field=field, window=window, threshold=threshold)
+    return Response(dumps_json({"start": start, "end": end, **result}), media_type="application/json")
+
+@router.get("/api/weather/cities")
+async def get_cities(
+    q: Optional[str] = Query(None, description="Prefixo para autocomplete"),
+    limit: int = Query(1000, ge=1, le=5000),
+    db: AsyncSession = Depends(session.get_async_db)
+):
+    return await async_crud.get_cities_with_records(db, prefix=q, limit=limit)
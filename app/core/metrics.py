@@ -0,0 +1,197 @@
+import bisect
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+
+# Buckets padrão de latência (segundos)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[str, ...]
+Sample = Tuple[Dict[str, str], float]
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Labels:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [
+            f"{self.name}{_format_labels(dict(zip(self.labelnames, key)))} {_format_value(value)}"
+            for key, value in values
+        ]
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Por série: contagem em cada bucket (não cumulativa), soma e total
+        self._series: Dict[Labels, List] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = [(key, list(counts), total, count) for key, (counts, total, count) in self._series.items()]
+        lines = []
+        for key, counts, total, count in series:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': _format_value(bound)})} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+class CallbackMetric(Metric):
+    """Valores lidos na hora da coleta (estatísticas de caches, pools etc.)"""
+
+    def __init__(self, name: str, help: str, collect: Callable[[], Iterable[Sample]], kind: str = "gauge"):
+        super().__init__(name, help)
+        self.kind = kind
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        try:
+            samples = list(self.collect())
+        except Exception as e:
+            print(f"  Falha ao coletar {self.name}: {e}")
+            return []
+        return [
+            f"{self.name}{_format_labels(labels)} {_format_value(value)}"
+            for labels, value in samples if value is not None
+        ]
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def callback(self, name: str, help: str, collect: Callable[[], Iterable[Sample]], kind: str = "gauge") -> CallbackMetric:
+        return self.register(CallbackMetric(name, help, collect, kind))
+
+    def render(self) -> str:
+        """Todas as métricas no formato texto do Prometheus"""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.header())
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+# Métricas dos caminhos quentes
+HTTP_REQUEST_DURATION = registry.histogram(
+    "climatrends_http_request_duration_seconds", "Latência das rotas HTTP", ["method", "route", "status"]
+)
+PROVIDER_REQUEST_DURATION = registry.histogram(
+    "climatrends_provider_request_duration_seconds", "Latência das chamadas aos provedores de clima", ["provider", "outcome"]
+)
+GEOCODER_REQUEST_DURATION = registry.histogram(
+    "climatrends_geocoder_request_duration_seconds", "Latência das chamadas à API de geocoding", ["outcome"]
+)
+DB_QUERY_DURATION = registry.histogram(
+    "climatrends_db_query_duration_seconds", "Latência das consultas ao banco", ["engine", "statement"]
+)
+WEATHER_FALLBACKS = registry.counter(
+    "climatrends_weather_fallbacks_total",
+    "Desvios do caminho normal na cadeia de provedores (circuit_open, rate_limited, stale_cache, deadline, mock_data)",
+    ["reason"]
+)
+
+# Tempo gasto por etapa dentro da requisição atual (para os logs de tempo)
+_request_stages: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_stages", default=None)
+
+def start_request_stages() -> Dict[str, float]:
+    stages: Dict[str, float] = {}
+    _request_stages.set(stages)
+    return stages
+
+def record_stage(stage: str, duration: float):
+    """Soma ``duration`` à etapa na requisição em andamento (se houver)"""
+    stages = _request_stages.get()
+    if stages is not None:
+        stages[stage] = stages.get(stage, 0.0) + duration
+
+def log_timing(event: str, duration: float, **fields):
+    """Log estruturado (uma linha JSON) de uma operação cronometrada"""
+    duration_ms = duration * 1000
+    if settings.TIMING_LOG_ENABLED or duration_ms >= settings.TIMING_LOG_SLOW_MS:
+        print(json.dumps({"event": event, "duration_ms": round(duration_ms, 2), **fields}, default=str), flush=True)
@@ -0,0 +1,41 @@
+import base64
+import json
+import re
+import unicodedata
+from datetime import datetime
+from typing import Any, Tuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def normalize_city(city: str) -> str:
+    """Normaliza nome de cidade para uso como chave (minúsculas, sem acentos)"""
+    text = unicodedata.normalize("NFKD", city or "")
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def encode_cursor(timestamp: datetime, record_id: int) -> str:
+    """Cursor opaco para paginação por (timestamp, id)"""
+    raw = f"{timestamp.isoformat()}|{record_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverso de encode_cursor; levanta ValueError se o cursor for inválido"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp, record_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(timestamp), int(record_id)
+    except Exception:
+        raise ValueError("Cursor inválido")
+
+def dumps_json(data: Any) -> bytes:
+    """Serializa em JSON com orjson quando disponível (datetimes em ISO 8601)"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(
+        data, ensure_ascii=False, separators=(",", ":"),
+        default=lambda value: value.isoformat() if isinstance(value, datetime) else str(value)
+    ).encode()
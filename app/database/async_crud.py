@@ -0,0 +1,70 @@
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import crud
+from app.database.models import GeocodeEntry, RollupColumns, WeatherRecord
+
+# Variantes assíncronas das consultas de crud: mesmas consultas, executadas
+# numa AsyncSession sem bloquear o event loop. A gravação em lote continua no
+# engine síncrono (COPY do psycopg2, fora do event loop pelo writer).
+
+async def create_weather_record(db: AsyncSession, weather_data: dict) -> WeatherRecord:
+    """Grava uma observação reaproveitando a lógica de crud (catálogo e agregados)"""
+    return await db.run_sync(crud.create_weather_record, weather_data)
+
+async def get_weather_records(
+    db: AsyncSession,
+    city: Optional[str] = None,
+    limit: int = 100,
+    match: str = "prefix",
+    before: Optional[Tuple[datetime, int]] = None
+) -> List[WeatherRecord]:
+    return (await db.execute(crud.weather_records_query(city, limit, match, before))).scalars().all()
+
+async def get_latest_weather_record(db: AsyncSession, city: str) -> Optional[WeatherRecord]:
+    records = await get_weather_records(db, city=city, limit=1, match="exact")
+    return records[0] if records else None
+
+async def get_weather_columns(
+    db: AsyncSession,
+    city: Optional[str] = None,
+    limit: int = 100,
+    match: str = "prefix",
+    before: Optional[Tuple[datetime, int]] = None,
+    fields: Optional[List[str]] = None
+) -> Dict[str, list]:
+    names = ["timestamp", "id"] + list(fields or crud.COLUMNAR_FIELDS)
+    rows = (await db.execute(crud.weather_columns_query(names, city, limit, match, before))).all()
+    return crud.as_columns(rows, names)
+
+async def get_weather_range_columns(
+    db: AsyncSession,
+    city: str,
+    start: datetime,
+    end: datetime,
+    fields: List[str]
+) -> Dict[str, list]:
+    names = ["timestamp"] + list(fields)
+    rows = (await db.execute(crud.range_columns_query(names, city, start, end))).all()
+    return crud.as_columns(rows, names)
+
+async def get_rollups(
+    db: AsyncSession,
+    city: str,
+    start: datetime,
+    end: datetime,
+    granularity: str = "hour",
+    country: Optional[str] = None
+) -> List[RollupColumns]:
+    return (await db.execute(crud.rollups_query(city, start, end, granularity, country))).scalars().all()
+
+async def get_city_version(db: AsyncSession, city: str) -> tuple:
+    return tuple((await db.execute(crud.city_version_query(city))).one())
+
+async def get_cities_with_records(db: AsyncSession, prefix: Optional[str] = None, limit: int = 1000) -> List[str]:
+    names = (await db.execute(crud.cities_query(prefix, limit))).scalars().all()
+    return list(dict.fromkeys(names))
+
+async def get_geocode(db: AsyncSession, city_key: str) -> Optional[GeocodeEntry]:
+    return await db.get(GeocodeEntry, city_key)
@@ -1,36 +1,470 @@
+import csv
+import io
+from datetime import datetime, timezone
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
-from app.database.models import WeatherRecord
+from sqlalchemy import desc, insert, text, case, func, select, delete, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from app.database.models import WeatherRecord, GeocodeEntry, City, WeatherHourly, WeatherDaily, RollupColumns
+from app.core.utils import normalize_city
 from app.schemas.weather import WeatherCreate
-from typing import List, Optional
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Colunas gravadas a partir dos dados dos provedores
+WEATHER_COLUMNS = [
+    "city", "city_key", "country", "temperature", "feels_like", "humidity", "pressure",
+    "wind_speed", "description", "weather_icon", "observed_at", "timestamp"
+]
+
+def _observed_at(weather_data: dict) -> Optional[datetime]:
+    observed_at = weather_data.get("observed_at") or weather_data.get("api_timestamp")
+    if isinstance(observed_at, str):
+        observed_at = datetime.fromisoformat(observed_at)
+    if observed_at is not None and observed_at.tzinfo is None:
+        observed_at = observed_at.replace(tzinfo=timezone.utc)
+    return observed_at
+
+def _weather_row(weather_data: dict) -> dict:
+    observed_at = _observed_at(weather_data)
+    return {
+        "city": weather_data.get("city"),
+        "city_key": normalize_city(weather_data.get("city")),
+        "country": weather_data.get("country"),
+        "temperature": weather_data.get("temperature"),
+        "feels_like": weather_data.get("feels_like"),
+        "humidity": weather_data.get("humidity"),
+        "pressure": weather_data.get("pressure"),
+        "wind_speed": weather_data.get("wind_speed"),
+        "description": weather_data.get("description"),
+        "weather_icon": weather_data.get("weather_icon") or weather_data.get("icon"),
+        "observed_at": observed_at,
+        # O horário do registro é o da observação quando o provedor informa
+        "timestamp": observed_at or datetime.now(timezone.utc)
+    }
+
+def _dialect_insert(db: Session, model):
+    """INSERT do dialeto em uso (com suporte a ON CONFLICT)"""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(model)
+    if dialect == "sqlite":
+        return sqlite.insert(model)
+    return insert(model)
+
+def _insert_ignore_duplicates(db: Session):
+    """INSERT ... ON CONFLICT DO NOTHING no dialeto do banco em uso"""
+    stmt = _dialect_insert(db, WeatherRecord)
+    if hasattr(stmt, "on_conflict_do_nothing"):
+        stmt = stmt.on_conflict_do_nothing()
+    return stmt
+
+# Colunas devolvidas pelos INSERTs para manter catálogo e agregados
+INSERTED_COLUMNS = [
+    "city", "city_key", "country", "timestamp",
+    "temperature", "humidity", "pressure", "wind_speed"
+]
+
+# Linhas por INSERT de várias linhas nos upserts (limite de parâmetros)
+UPSERT_CHUNK_SIZE = 500
+
+def _upsert(db: Session, model, entries: List[dict], index_elements, set_):
+    """INSERT ... ON CONFLICT DO UPDATE em blocos
+
+    ``set_`` recebe o pseudo-registro ``excluded`` e devolve as colunas a
+    atualizar quando a chave já existe. As linhas vão como parâmetros de
+    um executemany: o comando é compilado uma vez só e o SQLAlchemy o
+    agrupa em INSERTs de várias linhas (compilar um VALUES com milhares de
+    linhas custava mais que executá-lo nas cargas grandes).
+    """
+    stmt = _dialect_insert(db, model)
+    stmt = stmt.on_conflict_do_update(index_elements=index_elements, set_=set_(stmt.excluded))
+    db.execute(stmt.execution_options(insertmanyvalues_page_size=UPSERT_CHUNK_SIZE), entries)
 
 def create_weather_record(db: Session, weather_data: dict):
-    db_record = WeatherRecord(
-        city=weather_data.get("city"),
-        country=weather_data.get("country"),
-        temperature=weather_data.get("temperature"),
-        feels_like=weather_data.get("feels_like"),
-        humidity=weather_data.get("humidity"),
-        pressure=weather_data.get("pressure"),
-        wind_speed=weather_data.get("wind_speed"),
-        description=weather_data.get("description"),
-        weather_icon=weather_data.get("weather_icon")
+    """Grava uma observação e devolve a linha (a já existente, se repetida)"""
+    row = _weather_row(weather_data)
+    record_id = db.execute(_insert_ignore_duplicates(db).values(**row).returning(WeatherRecord.id)).scalar()
+    if record_id is None:
+        record_id = db.query(WeatherRecord.id).filter(
+            WeatherRecord.city == row["city"],
+            WeatherRecord.country == row["country"],
+            WeatherRecord.observed_at == row["observed_at"]
+        ).scalar()
+    else:
+        _update_city_catalog(db, [row], [weather_data])
+        _update_rollups(db, [row])
+    db.commit()
+    return db.get(WeatherRecord, record_id)
+
+def create_weather_records(db: Session, observations: List[dict]) -> int:
+    """Insere várias observações em uma única transação, ignorando repetidas
+
+    No PostgreSQL usa COPY para uma tabela temporária seguido de
+    INSERT ... SELECT ... ON CONFLICT DO NOTHING; nos demais bancos um
+    INSERT executemany (que o SQLAlchemy agrupa em INSERTs de várias linhas).
+    Retorna o número de linhas novas.
+    """
+    rows = [_weather_row(data) for data in observations]
+    if not rows:
+        return 0
+    if db.get_bind().dialect.name == "postgresql":
+        inserted = _copy_weather_rows(db, rows)
+    else:
+        returning = [getattr(WeatherRecord, col) for col in INSERTED_COLUMNS]
+        inserted = [r._asdict() for r in db.execute(_insert_ignore_duplicates(db).returning(*returning), rows)]
+    _update_city_catalog(db, inserted, observations)
+    _update_rollups(db, inserted)
+    db.commit()
+    return len(inserted)
+
+def _copy_weather_rows(db: Session, rows: List[dict]) -> List[dict]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(["\\N" if row[col] is None else row[col] for col in WEATHER_COLUMNS])
+    buffer.seek(0)
+    
+    columns = ", ".join(WEATHER_COLUMNS)
+    table = WeatherRecord.__tablename__
+    db.execute(text(
+        f"CREATE TEMP TABLE IF NOT EXISTS {table}_stage "
+        f"(LIKE {table} INCLUDING DEFAULTS) ON COMMIT DELETE ROWS"
+    ))
+    # Sem o default do id a staging não consome valores da sequência
+    db.execute(text(f"ALTER TABLE {table}_stage ALTER COLUMN id DROP DEFAULT, ALTER COLUMN id DROP NOT NULL"))
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {table}_stage ({columns}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+            buffer
+        )
+    finally:
+        cursor.close()
+    result = db.execute(text(
+        f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {table}_stage "
+        f"ON CONFLICT DO NOTHING RETURNING {', '.join(INSERTED_COLUMNS)}"
+    ))
+    return [r._asdict() for r in result]
+
+def _update_city_catalog(db: Session, inserted: List[dict], observations: List[dict]):
+    """Atualiza o catálogo de cidades com as linhas recém-inseridas"""
+    coordinates = {
+        (normalize_city(data.get("city")), data.get("country") or ""): (data.get("latitude"), data.get("longitude"))
+        for data in observations
+    }
+    
+    entries = {}
+    for row in inserted:
+        key = (row["city_key"], row["country"] or "")
+        entry = entries.get(key)
+        if entry is None:
+            latitude, longitude = coordinates.get(key, (None, None))
+            entry = entries[key] = {
+                "city_key": key[0],
+                "country": key[1],
+                "name": row["city"],
+                "latitude": latitude,
+                "longitude": longitude,
+                "first_seen": row["timestamp"],
+                "last_seen": row["timestamp"],
+                "record_count": 0
+            }
+        entry["first_seen"] = min(entry["first_seen"], row["timestamp"])
+        entry["last_seen"] = max(entry["last_seen"], row["timestamp"])
+        entry["record_count"] += 1
+    
+    if not entries:
+        return
+    
+    _upsert(db, City, list(entries.values()), [City.city_key, City.country], lambda excluded: {
+        "name": excluded.name,
+        "latitude": func.coalesce(excluded.latitude, City.latitude),
+        "longitude": func.coalesce(excluded.longitude, City.longitude),
+        "first_seen": case((excluded.first_seen < City.first_seen, excluded.first_seen), else_=City.first_seen),
+        "last_seen": case((excluded.last_seen > City.last_seen, excluded.last_seen), else_=City.last_seen),
+        "record_count": City.record_count + excluded.record_count
+    })
+
+def as_utc(value: datetime) -> datetime:
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+def hour_bucket(value: datetime) -> datetime:
+    return as_utc(value).replace(minute=0, second=0, microsecond=0)
+
+def day_bucket(value: datetime) -> datetime:
+    return as_utc(value).replace(hour=0, minute=0, second=0, microsecond=0)
+
+ROLLUPS = ((WeatherHourly, hour_bucket), (WeatherDaily, day_bucket))
+
+def _update_rollups(db: Session, inserted: List[dict]):
+    """Soma as linhas recém-inseridas aos agregados horários e diários"""
+    for model, truncate in ROLLUPS:
+        buckets = {}
+        for row in inserted:
+            if row.get("timestamp") is None:
+                continue
+            key = (row["city_key"], row["country"] or "", truncate(row["timestamp"]))
+            entry = buckets.get(key)
+            if entry is None:
+                entry = buckets[key] = {"city_key": key[0], "country": key[1], "bucket": key[2], "city": row["city"], "sample_count": 0}
+                for metric in RollupColumns.METRICS:
+                    entry.update({f"{metric}_min": None, f"{metric}_max": None, f"{metric}_sum": 0.0, f"{metric}_count": 0})
+            entry["sample_count"] += 1
+            for metric in RollupColumns.METRICS:
+                value = row.get(metric)
+                if value is None:
+                    continue
+                entry[f"{metric}_sum"] += value
+                entry[f"{metric}_count"] += 1
+                if entry[f"{metric}_min"] is None or value < entry[f"{metric}_min"]:
+                    entry[f"{metric}_min"] = value
+                if entry[f"{metric}_max"] is None or value > entry[f"{metric}_max"]:
+                    entry[f"{metric}_max"] = value
+        
+        if buckets:
+            _upsert(db, model, list(buckets.values()), [model.city_key, model.country, model.bucket], _rollup_merge(model))
+
+def _rollup_merge(model):
+    def merge(excluded):
+        values = {"city": excluded.city, "sample_count": model.sample_count + excluded.sample_count}
+        for metric in RollupColumns.METRICS:
+            current_min, new_min = getattr(model, f"{metric}_min"), getattr(excluded, f"{metric}_min")
+            current_max, new_max = getattr(model, f"{metric}_max"), getattr(excluded, f"{metric}_max")
+            values[f"{metric}_min"] = case((current_min.is_(None), new_min), (new_min < current_min, new_min), else_=current_min)
+            values[f"{metric}_max"] = case((current_max.is_(None), new_max), (new_max > current_max, new_max), else_=current_max)
+            values[f"{metric}_sum"] = getattr(model, f"{metric}_sum") + getattr(excluded, f"{metric}_sum")
+            values[f"{metric}_count"] = getattr(model, f"{metric}_count") + getattr(excluded, f"{metric}_count")
+        return values
+    return merge
+
+def rebuild_rollups(db: Session, city: Optional[str] = None, chunk_size: int = 5000) -> int:
+    """Recalcula os agregados a partir de weather_records (todas as cidades ou uma)
+
+    Os agregados passam a refletir só as linhas brutas guardadas: períodos
+    já removidos pela retenção somem deles. Para bancos sem agregados (ou
+    sem retenção); no dia a dia eles são mantidos a cada gravação.
+    """
+    city_key = normalize_city(city) if city else None
+    for model, _ in ROLLUPS:
+        stmt = delete(model)
+        if city_key:
+            stmt = stmt.where(model.city_key == city_key)
+        db.execute(stmt)
+    
+    query = select(*[getattr(WeatherRecord, col) for col in INSERTED_COLUMNS]).where(WeatherRecord.city_key.is_not(None))
+    if city_key:
+        query = query.where(WeatherRecord.city_key == city_key)
+    
+    total = 0
+    chunk = []
+    for row in db.execute(query.execution_options(yield_per=chunk_size)):
+        chunk.append(row._asdict())
+        if len(chunk) >= chunk_size:
+            _update_rollups(db, chunk)
+            total += len(chunk)
+            chunk = []
+    if chunk:
+        _update_rollups(db, chunk)
+        total += len(chunk)
+    db.commit()
+    return total
+
+def get_rollups(
+    db: Session,
+    city: str,
+    start: datetime,
+    end: datetime,
+    granularity: str = "hour",
+    country: Optional[str] = None
+) -> List[RollupColumns]:
+    """Agregados de uma cidade no intervalo [start, end)"""
+    return db.execute(rollups_query(city, start, end, granularity, country)).scalars().all()
+
+def rollups_query(city: str, start: datetime, end: datetime, granularity: str = "hour", country: Optional[str] = None):
+    model = WeatherDaily if granularity == "day" else WeatherHourly
+    truncate = day_bucket if granularity == "day" else hour_bucket
+    query = select(model).where(
+        model.city_key == normalize_city(city),
+        model.bucket >= truncate(start),
+        model.bucket < as_utc(end)
     )
-    db.add(db_record)
+    if country:
+        query = query.where(model.country == country)
+    return query.order_by(model.bucket)
+
+def rebuild_city_catalog(db: Session) -> int:
+    """Recalcula o catálogo de cidades a partir de weather_records"""
+    db.execute(delete(City))
+    aggregated = select(
+        WeatherRecord.city_key,
+        func.coalesce(WeatherRecord.country, ""),
+        func.max(WeatherRecord.city),
+        func.min(WeatherRecord.timestamp),
+        func.max(WeatherRecord.timestamp),
+        func.count()
+    ).where(WeatherRecord.city_key.is_not(None)).group_by(
+        WeatherRecord.city_key, func.coalesce(WeatherRecord.country, "")
+    )
+    db.execute(insert(City).from_select(
+        ["city_key", "country", "name", "first_seen", "last_seen", "record_count"], aggregated
+    ))
     db.commit()
-    db.refresh(db_record)
-    return db_record
+    return db.query(City).count()
+
+def _filter_city(query, city: str, match: str = "prefix"):
+    """Filtro por cidade usando a chave normalizada (usa o índice city_key)
+
+    - exact: igualdade
+    - prefix: começa com (inclui a igualdade)
+    - fuzzy: substring (no PostgreSQL atendida pelo índice de trigramas)
+    """
+    key = normalize_city(city)
+    if match == "exact":
+        return query.where(WeatherRecord.city_key == key)
+    if match == "fuzzy":
+        return query.where(WeatherRecord.city_key.contains(key, autoescape=True))
+    return query.where(WeatherRecord.city_key.startswith(key, autoescape=True))
 
 def get_weather_records(
     db: Session, 
     city: Optional[str] = None, 
-    limit: int = 100
+    limit: int = 100,
+    match: str = "prefix",
+    before: Optional[Tuple[datetime, int]] = None
 ) -> List[WeatherRecord]:
-    query = db.query(WeatherRecord)
+    """Registros mais recentes primeiro
+
+    ``before`` é a chave (timestamp, id) do último registro da página
+    anterior (paginação por keyset, sem OFFSET).
+    """
+    return db.execute(weather_records_query(city, limit, match, before)).scalars().all()
+
+def weather_records_query(city: Optional[str], limit: int, match: str = "prefix", before: Optional[Tuple[datetime, int]] = None):
+    return _history_query(select(WeatherRecord), city, match, before).limit(limit)
+
+def _history_query(query, city: Optional[str], match: str, before: Optional[Tuple[datetime, int]]):
+    if city:
+        query = _filter_city(query, city, match)
+    if before:
+        query = query.where(tuple_(WeatherRecord.timestamp, WeatherRecord.id) < tuple_(*before))
+    return query.order_by(desc(WeatherRecord.timestamp), desc(WeatherRecord.id))
+
+# Campos numéricos disponíveis no formato colunar
+COLUMNAR_FIELDS = ["temperature", "feels_like", "humidity", "pressure", "wind_speed"]
+
+def get_weather_columns(
+    db: Session,
+    city: Optional[str] = None,
+    limit: int = 100,
+    match: str = "prefix",
+    before: Optional[Tuple[datetime, int]] = None,
+    fields: Optional[List[str]] = None
+) -> Dict[str, list]:
+    """Mesmo recorte de get_weather_records, mas em colunas
+
+    Lê só as colunas pedidas (sem montar objetos ORM) e devolve uma lista
+    por campo, além de "timestamp" e "id".
+    """
+    names = ["timestamp", "id"] + list(fields or COLUMNAR_FIELDS)
+    return as_columns(db.execute(weather_columns_query(names, city, limit, match, before)).all(), names)
+
+def weather_columns_query(names: List[str], city: Optional[str], limit: int, match: str = "prefix", before=None):
+    query = _history_query(select(*[getattr(WeatherRecord, name) for name in names]), city, match, before)
+    return query.limit(limit)
+
+def as_columns(rows, names: List[str]) -> Dict[str, list]:
+    """Linhas (tuplas) para um dicionário de listas, uma por coluna"""
+    columns = list(zip(*rows)) if rows else [()] * len(names)
+    return {name: list(values) for name, values in zip(names, columns)}
+
+def get_weather_range_columns(
+    db: Session,
+    city: str,
+    start: datetime,
+    end: datetime,
+    fields: List[str]
+) -> Dict[str, list]:
+    """Colunas de uma cidade em [start, end), em ordem cronológica"""
+    names = ["timestamp"] + list(fields)
+    return as_columns(db.execute(range_columns_query(names, city, start, end)).all(), names)
+
+def range_columns_query(names: List[str], city: str, start: datetime, end: datetime):
+    query = _filter_city(select(*[getattr(WeatherRecord, name) for name in names]), city, "exact")
+    return query.where(WeatherRecord.timestamp >= start, WeatherRecord.timestamp < end).order_by(WeatherRecord.timestamp)
+
+# Colunas da exportação (na ordem dos arquivos gerados)
+EXPORT_COLUMNS = [
+    "id", "city", "country", "temperature", "feels_like", "humidity", "pressure",
+    "wind_speed", "description", "weather_icon", "observed_at", "timestamp"
+]
+
+def iter_weather_rows(
+    db: Session,
+    city: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    match: str = "exact",
+    chunk_size: int = 5000
+) -> Iterator[List[tuple]]:
+    """Percorre o histórico em blocos com cursor do lado do servidor
+
+    Só as colunas de EXPORT_COLUMNS são lidas (sem objetos ORM) e nunca
+    há mais de ``chunk_size`` linhas em memória.
+    """
+    query = select(*[getattr(WeatherRecord, col) for col in EXPORT_COLUMNS])
     if city:
-        query = query.filter(WeatherRecord.city.ilike(f"%{city}%"))
-    return query.order_by(desc(WeatherRecord.timestamp)).limit(limit).all()
+        query = _filter_city(query, city, match)
+    if start:
+        query = query.where(WeatherRecord.timestamp >= start)
+    if end:
+        query = query.where(WeatherRecord.timestamp < end)
+    query = query.order_by(WeatherRecord.timestamp, WeatherRecord.id)
+    
+    result = db.execute(query.execution_options(stream_results=True, yield_per=chunk_size))
+    for partition in result.partitions():
+        yield [tuple(row) for row in partition]
+
+def get_latest_weather_record(db: Session, city: str) -> Optional[WeatherRecord]:
+    records = get_weather_records(db, city=city, limit=1, match="exact")
+    return records[0] if records else None
+
+def get_city_version(db: Session, city: str) -> tuple:
+    """Versão dos dados de uma cidade (muda a cada nova observação gravada)"""
+    return tuple(db.execute(city_version_query(city)).one())
+
+def city_version_query(city: str):
+    return select(
+        func.coalesce(func.sum(City.record_count), 0), func.max(City.last_seen)
+    ).where(City.city_key == normalize_city(city))
+
+def get_cities_with_records(db: Session, prefix: Optional[str] = None, limit: int = 1000) -> List[str]:
+    """Nomes de cidades do catálogo, opcionalmente filtrados por prefixo"""
+    names = db.execute(cities_query(prefix, limit)).scalars().all()
+    return list(dict.fromkeys(names))
+
+def cities_query(prefix: Optional[str], limit: int):
+    query = select(City.name)
+    if prefix:
+        query = query.where(City.city_key.startswith(normalize_city(prefix), autoescape=True))
+        # Para autocomplete, cidades com mais observações primeiro
+        query = query.order_by(desc(City.record_count), City.name)
+    else:
+        query = query.order_by(City.name)
+    return query.limit(limit)
+
+def get_geocode(db: Session, city_key: str) -> Optional[GeocodeEntry]:
+    return db.get(GeocodeEntry, city_key)
+
+def save_geocode(db: Session, city_key: str, location: dict) -> GeocodeEntry:
+    entry = GeocodeEntry(
+        city_key=city_key,
+        name=location.get("name"),
+        country=location.get("country"),
+        latitude=location.get("latitude"),
+        longitude=location.get("longitude")
+    )
+    entry = db.merge(entry)
+    db.commit()
+    return entry
 
-def get_cities_with_records(db: Session) -> List[str]:
-    records = db.query(WeatherRecord.city).distinct().all()
-    return [record[0] for record in records]
\ No newline at end of file
+def get_geocodes(db: Session, limit: int = 1000) -> List[GeocodeEntry]:
+    return db.query(GeocodeEntry).order_by(desc(GeocodeEntry.created_at)).limit(limit).all()
\ No newline at end of file
@@ -1,12 +1,19 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime
+from sqlalchemy import Column, Integer, String, Float, DateTime, UniqueConstraint, Index, DDL, event
 from sqlalchemy.sql import func
 from app.database.session import Base
 
 class WeatherRecord(Base):
     __tablename__ = "weather_records"
+    __table_args__ = (
+        # Uma linha por observação do provedor (repetições viram no-op). No
+        # PostgreSQL a tabela é particionada por timestamp, que precisa fazer
+        # parte da chave; como timestamp = observed_at, a deduplicação é a mesma.
+        UniqueConstraint("city", "country", "observed_at", "timestamp", name="uq_weather_records_observation"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     city = Column(String(100), index=True)
+    city_key = Column(String(100))
     country = Column(String(10))
     temperature = Column(Float)
     feels_like = Column(Float)
@@ -15,6 +22,7 @@ class WeatherRecord(Base):
     wind_speed = Column(Float)
     description = Column(String(200))
     weather_icon = Column(String(10))
+    observed_at = Column(DateTime(timezone=True))
     timestamp = Column(DateTime(timezone=True), server_default=func.now())
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
@@ -30,6 +38,138 @@ class WeatherRecord(Base):
             "wind_speed": self.wind_speed,
             "description": self.description,
             "weather_icon": self.weather_icon,
+            "observed_at": self.observed_at.isoformat() if self.observed_at else None,
             "timestamp": self.timestamp.isoformat() if self.timestamp else None,
             "created_at": self.created_at.isoformat() if self.created_at else None
+        }
+
+# Histórico por cidade: igualdade/prefixo em city_key + ordem por timestamp
+Index(
+    "ix_weather_records_city_key_timestamp",
+    WeatherRecord.city_key, WeatherRecord.timestamp.desc(),
+    postgresql_ops={"city_key": "text_pattern_ops"}
+)
+
+# Busca por substring (modo "fuzzy") indexada com pg_trgm. Criada de forma
+# tolerante: sem a extensão disponível o modo continua funcionando, só que
+# sem índice.
+event.listen(
+    WeatherRecord.__table__,
+    "after_create",
+    DDL("""
+        DO $$
+        BEGIN
+            CREATE EXTENSION IF NOT EXISTS pg_trgm;
+            CREATE INDEX IF NOT EXISTS ix_weather_records_city_key_trgm
+                ON weather_records USING gin (city_key gin_trgm_ops);
+        EXCEPTION WHEN OTHERS THEN
+            RAISE NOTICE 'pg_trgm unavailable: %%', SQLERRM;
+        END $$;
+    """).execute_if(dialect="postgresql")
+)
+
+
+class City(Base):
+    """Catálogo de cidades com observações (mantido a cada gravação)"""
+    __tablename__ = "cities"
+    __table_args__ = (
+        UniqueConstraint("city_key", "country", name="uq_cities_city_key_country"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    city_key = Column(String(100), nullable=False)
+    name = Column(String(100), nullable=False)
+    country = Column(String(10), nullable=False, default="")
+    latitude = Column(Float)
+    longitude = Column(Float)
+    first_seen = Column(DateTime(timezone=True))
+    last_seen = Column(DateTime(timezone=True))
+    record_count = Column(Integer, nullable=False, default=0)
+    
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "country": self.country,
+            "latitude": self.latitude,
+            "longitude": self.longitude,
+            "first_seen": self.first_seen.isoformat() if self.first_seen else None,
+            "last_seen": self.last_seen.isoformat() if self.last_seen else None,
+            "record_count": self.record_count
+        }
+
+# Autocomplete por prefixo da chave normalizada
+Index("ix_cities_city_key", City.city_key, postgresql_ops={"city_key": "text_pattern_ops"})
+
+
+class RollupColumns:
+    """Colunas comuns dos agregados horários e diários
+
+    Guarda soma e contagem (além de mínimo e máximo) de cada métrica para
+    que a média possa ser atualizada de forma incremental.
+    """
+    city_key = Column(String(100), primary_key=True)
+    country = Column(String(10), primary_key=True, default="")
+    bucket = Column(DateTime(timezone=True), primary_key=True)
+    city = Column(String(100))
+    sample_count = Column(Integer, nullable=False, default=0)
+    temperature_min = Column(Float)
+    temperature_max = Column(Float)
+    temperature_sum = Column(Float, nullable=False, default=0)
+    temperature_count = Column(Integer, nullable=False, default=0)
+    humidity_min = Column(Float)
+    humidity_max = Column(Float)
+    humidity_sum = Column(Float, nullable=False, default=0)
+    humidity_count = Column(Integer, nullable=False, default=0)
+    pressure_min = Column(Float)
+    pressure_max = Column(Float)
+    pressure_sum = Column(Float, nullable=False, default=0)
+    pressure_count = Column(Integer, nullable=False, default=0)
+    wind_speed_min = Column(Float)
+    wind_speed_max = Column(Float)
+    wind_speed_sum = Column(Float, nullable=False, default=0)
+    wind_speed_count = Column(Integer, nullable=False, default=0)
+    
+    METRICS = ("temperature", "humidity", "pressure", "wind_speed")
+    
+    def to_dict(self):
+        data = {
+            "bucket": self.bucket.isoformat() if self.bucket else None,
+            "city": self.city,
+            "country": self.country,
+            "samples": self.sample_count
+        }
+        for metric in self.METRICS:
+            count = getattr(self, f"{metric}_count")
+            data[metric] = {
+                "min": getattr(self, f"{metric}_min"),
+                "max": getattr(self, f"{metric}_max"),
+                "mean": round(getattr(self, f"{metric}_sum") / count, 2) if count else None
+            }
+        return data
+
+
+class WeatherHourly(RollupColumns, Base):
+    __tablename__ = "weather_hourly"
+
+
+class WeatherDaily(RollupColumns, Base):
+    __tablename__ = "weather_daily"
+
+
+class GeocodeEntry(Base):
+    __tablename__ = "geocode_cache"
+    
+    city_key = Column(String(100), primary_key=True)
+    name = Column(String(100))
+    country = Column(String(10))
+    latitude = Column(Float)
+    longitude = Column(Float)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "country": self.country,
+            "latitude": self.latitude,
+            "longitude": self.longitude
         }
\ No newline at end of file
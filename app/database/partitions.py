@@ -0,0 +1,173 @@
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.database import crud
+from app.database.session import SessionLocal
+from app.database.models import WeatherHourly, WeatherRecord
+
+# weather_records é particionada por mês de "timestamp" no PostgreSQL
+# (migração 0003). Linhas fora das partições criadas caem em
+# weather_records_default até a partição do mês ser criada.
+TABLE = WeatherRecord.__tablename__
+DEFAULT_PARTITION = f"{TABLE}_default"
+
+# Trava para que só um processo mexa nas partições por vez
+ADVISORY_LOCK_ID = 0x434C494D
+
+Partition = Tuple[str, datetime, datetime]
+
+def month_start(value: datetime) -> datetime:
+    value = value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+def add_months(value: datetime, months: int) -> datetime:
+    index = value.year * 12 + value.month - 1 + months
+    return value.replace(year=index // 12, month=index % 12 + 1)
+
+def partition_name(start: datetime) -> str:
+    return f"{TABLE}_p{start:%Y_%m}"
+
+def is_partitioned(db: Session) -> bool:
+    if db.get_bind().dialect.name != "postgresql":
+        return False
+    return db.execute(
+        text("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(:table)"), {"table": TABLE}
+    ).scalar() or False
+
+def _parse_bound(value: str) -> datetime:
+    # pg_get_expr devolve '2026-10-01 00:00:00+00' (fuso da sessão, às vezes só com horas)
+    if re.search(r"[+-]\d{2}$", value):
+        value += ":00"
+    return datetime.fromisoformat(value).astimezone(timezone.utc)
+
+def list_partitions(db: Session) -> List[Partition]:
+    """Partições mensais (nome, início, fim), em ordem cronológica; sem a default"""
+    rows = db.execute(text("""
+        SELECT child.relname, pg_get_expr(child.relpartbound, child.oid)
+        FROM pg_inherits
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE pg_inherits.inhparent = to_regclass(:table)
+    """), {"table": TABLE}).all()
+    
+    partitions = []
+    for name, bound in rows:
+        match = re.search(r"FROM \('([^']+)'\) TO \('([^']+)'\)", bound or "")
+        if match:
+            partitions.append((name, _parse_bound(match.group(1)), _parse_bound(match.group(2))))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+def _lock(db: Session):
+    db.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": ADVISORY_LOCK_ID})
+
+def create_partition(db: Session, start: datetime) -> str:
+    """Cria a partição do mês de ``start``, trazendo as linhas que estavam na default
+
+    A tabela é criada solta, recebe as linhas do mês que estavam na
+    partição default e só então é anexada (o ATTACH falharia com essas
+    linhas ainda na default).
+    """
+    start = month_start(start)
+    end = add_months(start, 1)
+    name = partition_name(start)
+    bounds = {"start": start, "end": end}
+    db.execute(text(f"CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS)"))
+    db.execute(text(f"""
+        WITH moved AS (
+            DELETE FROM {DEFAULT_PARTITION}
+            WHERE timestamp >= :start AND timestamp < :end
+            RETURNING *
+        )
+        INSERT INTO {name} SELECT * FROM moved
+    """), bounds)
+    db.execute(text(
+        f"ALTER TABLE {TABLE} ATTACH PARTITION {name} "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    ))
+    return name
+
+def ensure_partitions(db: Session, start: Optional[datetime] = None, months_ahead: Optional[int] = None) -> List[str]:
+    """Garante partições do mês de ``start`` (padrão: atual) até ``months_ahead`` meses à frente"""
+    if not is_partitioned(db):
+        return []
+    months_ahead = settings.PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+    now = month_start(datetime.now(timezone.utc))
+    month = month_start(start) if start else now
+    last = add_months(max(month, now), months_ahead)
+    
+    _lock(db)
+    existing = {partition[1] for partition in list_partitions(db)}
+    created = []
+    while month <= last:
+        if month not in existing:
+            created.append(create_partition(db, month))
+        month = add_months(month, 1)
+    db.commit()
+    return created
+
+def prepare_partitions() -> List[str]:
+    """Cria as partições que faltam na inicialização (sem derrubar a API em caso de erro)"""
+    db = SessionLocal()
+    try:
+        return ensure_partitions(db)
+    except Exception as e:
+        print(f"  Não foi possível criar as partições de {TABLE}: {e}")
+        return []
+    finally:
+        db.close()
+
+def retention_cutoff(months: int, now: Optional[datetime] = None) -> datetime:
+    """Início do mês mais antigo cujas linhas brutas são mantidas"""
+    return add_months(month_start(now or datetime.now(timezone.utc)), -months)
+
+def drop_partition(db: Session, name: str):
+    """Desanexa e remove uma partição mensal (as linhas já estão nos agregados)"""
+    db.execute(text(f"ALTER TABLE {TABLE} DETACH PARTITION {name}"))
+    db.execute(text(f"DROP TABLE {name}"))
+    db.commit()
+
+def apply_retention(
+    db: Session,
+    raw_months: Optional[int] = None,
+    hourly_days: Optional[int] = None
+) -> Dict[str, Any]:
+    """Remove linhas brutas antigas e agregados horários antigos
+
+    Cada observação entra nos agregados horário e diário no momento em que
+    é gravada, então a retenção só apaga: linhas brutas com mais de
+    ``raw_months`` meses (no PostgreSQL particionado, partições mensais
+    inteiras, sem DELETE nem VACUUM) e agregados horários com mais de
+    ``hourly_days`` dias. Os agregados diários ficam. Zero desativa cada
+    etapa.
+    """
+    raw_months = settings.RAW_RETENTION_MONTHS if raw_months is None else raw_months
+    hourly_days = settings.HOURLY_RETENTION_DAYS if hourly_days is None else hourly_days
+    report: Dict[str, Any] = {"dropped_partitions": [], "deleted_rows": 0, "deleted_hourly": 0}
+    
+    if raw_months > 0:
+        cutoff = retention_cutoff(raw_months)
+        report["cutoff"] = cutoff.isoformat()
+        if is_partitioned(db):
+            _lock(db)
+            for name, start, end in list_partitions(db):
+                if end <= cutoff:
+                    drop_partition(db, name)
+                    report["dropped_partitions"].append(name)
+                    _lock(db)
+            # Linhas antigas que tenham ficado na partição default
+            report["deleted_rows"] += db.execute(
+                text(f"DELETE FROM {DEFAULT_PARTITION} WHERE timestamp < :cutoff"), {"cutoff": cutoff}
+            ).rowcount
+        else:
+            report["deleted_rows"] += db.execute(delete(WeatherRecord).where(WeatherRecord.timestamp < cutoff)).rowcount
+        db.commit()
+    
+    if hourly_days > 0:
+        hourly_cutoff = crud.day_bucket(datetime.now(timezone.utc) - timedelta(days=hourly_days))
+        report["deleted_hourly"] = db.execute(delete(WeatherHourly).where(WeatherHourly.bucket < hourly_cutoff)).rowcount
+        db.commit()
+    return report
@@ -1,15 +1,112 @@
-from sqlalchemy import create_engine
+import time
+from typing import Any, AsyncIterator, Dict, Optional
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
+from app.core.metrics import DB_QUERY_DURATION, log_timing, record_stage
 
-engine = create_engine(settings.DATABASE_URL)
+# Drivers assíncronos usados para cada banco
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite"
+}
+
+def _engine_options(url: str) -> Dict[str, Any]:
+    """Opções do pool de conexões (o SQLite usa o pool padrão do dialeto)"""
+    if make_url(url).get_backend_name() == "sqlite":
+        return {}
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING
+    }
+
+def async_database_url(url: str) -> str:
+    """Mesma URL do banco com o driver assíncrono (asyncpg / aiosqlite)"""
+    if settings.ASYNC_DATABASE_URL:
+        return settings.ASYNC_DATABASE_URL
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.get_backend_name())
+    return parsed.set(drivername=driver).render_as_string(hide_password=False) if driver else url
+
+def _instrument(sync_engine, name: str):
+    """Tempo de cada consulta (histograma, etapa da requisição e log das lentas)"""
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - conn.info["query_started"].pop()
+        kind = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+        DB_QUERY_DURATION.observe(duration, engine=name, statement=kind)
+        record_stage("db", duration)
+        if duration * 1000 >= settings.TIMING_LOG_SLOW_MS:
+            log_timing("db_query", duration, engine=name, statement=" ".join(statement.split())[:300])
+
+# Engine síncrono: scripts, gravação em lote (COPY) e exportação em streaming
+engine = create_engine(settings.DATABASE_URL, **_engine_options(settings.DATABASE_URL))
+_instrument(engine, "sync")
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Engine assíncrono: criado no primeiro uso, para que o driver só seja
+# exigido por quem usa o caminho assíncrono
+_async_engine: Optional[AsyncEngine] = None
+_async_sessionmaker: Optional[async_sessionmaker] = None
+
+def get_async_engine() -> AsyncEngine:
+    global _async_engine, _async_sessionmaker
+    if _async_engine is None:
+        url = async_database_url(settings.DATABASE_URL)
+        _async_engine = create_async_engine(url, **_engine_options(url))
+        _instrument(_async_engine.sync_engine, "async")
+        _async_sessionmaker = async_sessionmaker(_async_engine, autoflush=False, expire_on_commit=False)
+    return _async_engine
+
+def AsyncSessionLocal() -> AsyncSession:
+    get_async_engine()
+    return _async_sessionmaker()
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    """Sessão assíncrona: as consultas não bloqueiam o event loop"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def dispose_async_engine():
+    """Fecha as conexões do engine assíncrono (shutdown da aplicação)"""
+    global _async_engine
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    _async_engine = None
+
+def _pool_stats(pool) -> Dict[str, Any]:
+    stats: Dict[str, Any] = {"class": type(pool).__name__}
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        method = getattr(pool, name, None)
+        if callable(method):
+            stats[name] = method()
+    if "size" in stats and "checkedout" in stats:
+        capacity = stats["size"] + max(getattr(pool, "_max_overflow", 0), 0)
+        stats["capacity"] = capacity
+        stats["saturation"] = round(stats["checkedout"] / capacity, 4) if capacity else None
+    return stats
+
+def pool_stats() -> Dict[str, Any]:
+    """Uso dos pools de conexões (síncrono e assíncrono)"""
+    stats = {"sync": _pool_stats(engine.pool)}
+    if _async_engine is not None:
+        stats["async"] = _pool_stats(_async_engine.pool)
+    return stats
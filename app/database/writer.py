@@ -0,0 +1,166 @@
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import Any, List, Optional, Set, Tuple
+
+from sqlalchemy import exc
+
+from app.core.config import settings
+from app.database import crud
+from app.database.session import SessionLocal
+
+# Falhas de conexão com o banco: o lote espera o banco voltar
+TRANSIENT_ERRORS = (exc.OperationalError, exc.InterfaceError, exc.DisconnectionError, exc.TimeoutError, ConnectionError)
+
+class WeatherWriter:
+    """Gravação em lote (write-behind) de observações
+
+    As observações ficam num buffer em memória e são gravadas de uma vez
+    quando o buffer chega a ``batch_size`` ou a cada ``flush_interval``
+    segundos. Se o banco estiver fora do ar o lote volta para o buffer
+    (limitado a ``max_buffer`` linhas); outros erros fazem o lote ser
+    regravado linha a linha e as linhas que falham sozinhas são descartadas
+    (``rejected``), para não travar os lotes seguintes.
+
+    Observações iguais à última já recebida para a mesma cidade (mesmo
+    ``observed_at``, lembrado para até ``max_cities`` cidades) são
+    descartadas antes de chegar ao banco; as que o banco ignora por já
+    existirem também contam em ``skipped``. ``written`` conta só linhas
+    novas. Endpoints que precisam devolver a linha gravada continuam usando
+    ``crud.create_weather_record``.
+    """
+
+    def __init__(self, batch_size: int = 500, flush_interval: float = 2.0, max_buffer: int = 50000, max_cities: int = 10000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.max_cities = max_cities
+        self._buffer: List[dict] = []
+        self._lock = threading.Lock()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        # Referências aos flushes disparados por submit (o loop guarda só referências fracas)
+        self._flushes: Set[asyncio.Task] = set()
+        self._last_seen: "OrderedDict[Tuple[str, str], Any]" = OrderedDict()
+        self.written = 0
+        self.skipped = 0
+        self.dropped = 0
+        self.rejected = 0
+
+    def submit(self, weather_data: dict):
+        self.submit_many([weather_data])
+
+    def submit_many(self, observations: List[dict]):
+        with self._lock:
+            for data in observations:
+                key = (data.get("city"), data.get("country"))
+                observed_at = data.get("observed_at") or data.get("api_timestamp")
+                if observed_at is not None and self._last_seen.get(key) == observed_at:
+                    self.skipped += 1
+                    continue
+                self._last_seen[key] = observed_at
+                self._last_seen.move_to_end(key)
+                if len(self._last_seen) > self.max_cities:
+                    self._last_seen.popitem(last=False)
+                self._buffer.append(data)
+            overflow = len(self._buffer) - self.max_buffer
+            if overflow > 0:
+                del self._buffer[:overflow]
+                self.dropped += overflow
+                print(f"  Buffer de gravação cheio, {overflow} observações descartadas")
+            full = len(self._buffer) >= self.batch_size
+        
+        if full:
+            try:
+                task = asyncio.get_running_loop().create_task(self.flush())
+            except RuntimeError:
+                # Fora do event loop (scripts): grava na hora
+                self.flush_sync()
+            else:
+                self._flushes.add(task)
+                task.add_done_callback(self._flushes.discard)
+
+    def pending(self) -> int:
+        return len(self._buffer)
+
+    def _take(self) -> List[dict]:
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+        return batch
+
+    def _restore(self, batch: List[dict]):
+        with self._lock:
+            self._buffer = (batch + self._buffer)[-self.max_buffer:]
+
+    def flush_sync(self) -> int:
+        batch = self._take()
+        if not batch:
+            return 0
+        done = written = 0
+        db = SessionLocal()
+        try:
+            while done < len(batch):
+                chunk = batch[done:done + self.batch_size]
+                try:
+                    inserted = crud.create_weather_records(db, chunk)
+                except TRANSIENT_ERRORS:
+                    raise
+                except Exception as e:
+                    db.rollback()
+                    print(f"  Falha ao gravar lote de observações: {e}; gravando linha a linha")
+                    for data in chunk:
+                        try:
+                            inserted = crud.create_weather_records(db, [data])
+                            written += inserted
+                            self.skipped += 1 - inserted
+                        except TRANSIENT_ERRORS:
+                            raise
+                        except Exception as error:
+                            db.rollback()
+                            self.rejected += 1
+                            print(f"  Observação descartada ({data.get('city')}, {data.get('observed_at')}): {error}")
+                        done += 1
+                else:
+                    done += len(chunk)
+                    written += inserted
+                    # Repetidas ignoradas pelo banco (ON CONFLICT DO NOTHING)
+                    self.skipped += len(chunk) - inserted
+        except Exception as e:
+            db.rollback()
+            print(f"  Falha ao gravar lote de observações: {e}")
+            # Só as linhas ainda não gravadas voltam para o buffer
+            self._restore(batch[done:])
+        finally:
+            db.close()
+        self.written += written
+        return written
+
+    async def flush(self) -> int:
+        async with self._flush_lock:
+            return await asyncio.to_thread(self.flush_sync)
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        """Para o flush periódico e grava o que restou no buffer"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+weather_writer = WeatherWriter(
+    batch_size=settings.WRITER_BATCH_SIZE,
+    flush_interval=settings.WRITER_FLUSH_INTERVAL,
+    max_buffer=settings.WRITER_MAX_BUFFER
+)
@@ -1,13 +1,31 @@
-from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import HTMLResponse
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, HTTPException, Depends, Query
+from fastapi.responses import HTMLResponse, Response
 from fastapi.templating import Jinja2Templates
-import requests
 import uvicorn
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import os
 from dotenv import load_dotenv
-import random
 import json
+import time
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.services.http_client import close_http_client
+from app.services.geocoding import warm_geocode_cache
+from app.services.cache import weather_cache, trends_cache
+from app.services.analytics import analytics_cache
+from app.services.resilience import providers_stats
+from app.services.rate_limit import rate_limiter
+from app.services.scheduler import ingestion_scheduler
+from app.database.writer import weather_writer
+from app.api import endpoints
+from app.database import async_crud, crud, partitions, session
+from app.services.downsampling import downsample_columns
+from app.services.providers import OPENWEATHER_API_KEY, get_weather_data, get_weather_batch
+from app.schemas.weather import WeatherBatchRequest, WeatherBatchResponse
+from app.core.config import settings
+from app.core.metrics import HTTP_REQUEST_DURATION, log_timing, registry, start_request_stages
 
 # Carregar variáveis de ambiente
 load_dotenv()
@@ -15,178 +33,52 @@ load_dotenv()
 print("API KEY carregada:", os.getenv("OPENWEATHER_API_KEY"))
 
 
-app = FastAPI(title="ClimaTrends")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Aquece o cache de geocoding com as cidades já conhecidas no banco
+    warmed = await asyncio.to_thread(warm_geocode_cache)
+    print(f" Cache de geocoding: {warmed} cidades carregadas")
+    # Partições mensais de weather_records para os próximos meses (PostgreSQL)
+    created = await asyncio.to_thread(partitions.prepare_partitions)
+    if created:
+        print(f" Partições criadas: {', '.join(created)}")
+    weather_writer.start()
+    if settings.INGESTION_ENABLED:
+        ingestion_scheduler.start()
+    yield
+    await ingestion_scheduler.stop()
+    # Grava o que ainda estiver no buffer antes de encerrar
+    await weather_writer.stop()
+    # Libera o pool de conexões HTTP compartilhado
+    await close_http_client()
+    await session.dispose_async_engine()
 
-# Configurar templates
-templates = Jinja2Templates(directory="app/templates")
 
-# Configurações da API OpenWeather
-OPENWEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY", "").strip()
-OPENWEATHER_URL = "https://api.openweathermap.org/data/2.5/weather"
+app = FastAPI(title="ClimaTrends", lifespan=lifespan)
 
-def get_weather_data(city: str):
-    """Busca dados de clima """
-    
-    print(f"\n Buscando clima para: {city}")
-    
-    # PRIMEIRO: Tenta OpenWeather se tiver chave válida
-    if OPENWEATHER_API_KEY and OPENWEATHER_API_KEY != "sua_chave_aqui":
-        result = try_openweather(city)
-        if result and not result.get("error"):
-            return result
-    
-    # SEGUNDO: Tenta Open-Meteo (não precisa de chave)
-    result = try_openmeteo(city)
-    if result and not result.get("error"):
-        return result
-    
-    # TERCEIRO: Retorna mock data
-    print(f"  Todas as APIs falharam, usando dados mock")
-    return get_mock_data(city, "APIs indisponíveis")
+# Configurar templates
+templates = Jinja2Templates(directory="app/templates")
 
-def try_openweather(city: str):
-    """Tenta OpenWeather API"""
+@app.middleware("http")
+async def timing_middleware(request: Request, call_next):
+    """Latência por rota (histograma) e log com o tempo de cada etapa"""
+    stages = start_request_stages()
+    started = time.perf_counter()
+    status = 500
     try:
-        params = {
-            "q": city.replace(" ", "%20"),
-            "appid": OPENWEATHER_API_KEY,
-            "units": "metric",
-            "lang": "pt_br"
-        }
-        
-        response = requests.get(
-            "https://api.openweathermap.org/data/2.5/weather",
-            params=params,
-            timeout=8
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        duration = time.perf_counter() - started
+        # Rota com parâmetros ({metric}) em vez do caminho, para não explodir as séries
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        HTTP_REQUEST_DURATION.observe(duration, method=request.method, route=route, status=status)
+        log_timing(
+            "http_request", duration,
+            method=request.method, route=route, status=status,
+            stages_ms={stage: round(value * 1000, 2) for stage, value in stages.items()}
         )
-        
-        if response.status_code == 200:
-            data = response.json()
-            print(f"   OpenWeather: {data['main']['temp']}°C")
-            return parse_openweather_data(data, city)
-        else:
-            print(f"  OpenWeather erro {response.status_code}")
-            return None
-            
-    except Exception as e:
-        print(f"   OpenWeather falhou: {e}")
-        return None
-
-def try_openmeteo(city: str):
-    """Usa Open-Meteo API (gratuita, sem chave)"""
-    try:
-        # Primeiro busca coordenadas da cidade
-        geo_url = "https://geocoding-api.open-meteo.com/v1/search"
-        geo_params = {
-            "name": city,
-            "count": 1,
-            "language": "pt",
-            "format": "json"
-        }
-        
-        geo_response = requests.get(geo_url, params=geo_params, timeout=8)
-        
-        if geo_response.status_code == 200:
-            geo_data = geo_response.json()
-            if geo_data.get("results"):
-                location = geo_data["results"][0]
-                
-                # Agora busca dados climáticos
-                weather_url = "https://api.open-meteo.com/v1/forecast"
-                weather_params = {
-                    "latitude": location["latitude"],
-                    "longitude": location["longitude"],
-                    "current": "temperature_2m,relative_humidity_2m,pressure_msl,wind_speed_10m,weather_code",
-                    "timezone": "auto"
-                }
-                
-                weather_response = requests.get(weather_url, params=weather_params, timeout=8)
-                
-                if weather_response.status_code == 200:
-                    weather_data = weather_response.json()["current"]
-                    print(f"   Open-Meteo: {weather_data['temperature_2m']}°C")
-                    
-                    # Mapear weather_code para descrição
-                    weather_codes = {
-                        0: "Céu limpo", 1: "Poucas nuvens", 2: "Parcialmente nublado",
-                        3: "Nublado", 45: "Nevoeiro", 48: "Nevoeiro com geada",
-                        51: "Chuvisco leve", 53: "Chuvisco moderado", 55: "Chuvisco forte",
-                        61: "Chuva leve", 63: "Chuva moderada", 65: "Chuva forte",
-                        71: "Neve leve", 73: "Neve moderada", 75: "Neve forte",
-                        80: "Pancadas de chuva leves", 81: "Pancadas de chuva fortes",
-                        95: "Tempestade", 96: "Tempestade com granizo leve",
-                        99: "Tempestade com granizo forte"
-                    }
-                    
-                    desc = weather_codes.get(weather_data.get("weather_code", 0), "Desconhecido")
-                    
-                    return {
-                        "city": location["name"],
-                        "country": location.get("country_code", ""),
-                        "temperature": weather_data["temperature_2m"],
-                        "feels_like": weather_data["temperature_2m"],
-                        "humidity": weather_data["relative_humidity_2m"],
-                        "pressure": weather_data["pressure_msl"],
-                        "description": desc,
-                        "wind_speed": weather_data["wind_speed_10m"],
-                        "icon": get_icon_from_code(weather_data.get("weather_code", 0)),
-                        "timestamp": datetime.now().strftime("%H:%M"),
-                        "error": False,
-                        "source": "openmeteo"
-                    }
-                    
-    except Exception as e:
-        print(f"  Open-Meteo falhou: {e}")
-    
-    return None
-
-def get_icon_from_code(code: int) -> str:
-    """Converte código de clima para ícone"""
-    icon_map = {
-        0: "01d", 1: "02d", 2: "03d", 3: "04d",
-        45: "50d", 48: "50d",
-        51: "09d", 53: "09d", 55: "09d",
-        61: "10d", 63: "10d", 65: "10d",
-        71: "13d", 73: "13d", 75: "13d",
-        80: "09d", 81: "09d",
-        95: "11d", 96: "11d", 99: "11d"
-    }
-    return icon_map.get(code, "01d")
-
-def parse_openweather_data(data, city):
-    """Parse dados OpenWeather"""
-    return {
-        "city": data.get("name", city),
-        "country": data.get("sys", {}).get("country", ""),
-        "temperature": data.get("main", {}).get("temp", 0),
-        "feels_like": data.get("main", {}).get("feels_like", 0),
-        "humidity": data.get("main", {}).get("humidity", 0),
-        "pressure": data.get("main", {}).get("pressure", 0),
-        "description": data.get("weather", [{}])[0].get("description", "").capitalize(),
-        "wind_speed": data.get("wind", {}).get("speed", 0),
-        "icon": data.get("weather", [{}])[0].get("icon", "01d"),
-        "timestamp": datetime.now().strftime("%H:%M"),
-        "error": False,
-        "source": "openweathermap"
-    }
-
-def get_mock_data(city: str, reason: str = "APIs indisponíveis"):
-    """Retorna dados fixos quando as APIs não respondem"""
-    return {
-        "city": city,
-        "country": "XX",
-        "temperature": None,
-        "feels_like": None,
-        "humidity": None,
-        "pressure": None,
-        "description": "Dados indisponíveis",
-        "wind_speed": None,
-        "icon": "01d",
-        "timestamp": datetime.now().strftime("%H:%M"),
-        "error": True,
-        "error_message": reason,
-        "source": "fallback"
-    }
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -201,46 +93,54 @@ async def home(request: Request):
     )
 
 @app.get("/dashboard", response_class=HTMLResponse)
-async def dashboard(request: Request, city: str = "São Paulo"):
-    # Buscar dados (reais ou mock)
-    weather_data = get_weather_data(city)
-    
-    # Verificar se são dados reais ou mock
-    has_error = weather_data.get("error", True)  # Default para True por segurança
-    is_real_data = weather_data.get("source") == "openweathermap"
-    
-    # Gerar dados para gráfico
-    current_hour = datetime.now().hour
-    times = []
-    temperatures = []
-    humidities = []
-    
-    # Simula últimas 6 horas
-    for i in range(6, 0, -1):
-        hour = (current_hour - i) % 24
-        times.append(f"{hour:02d}:00")
-        
-        if is_real_data:
-            # Variação baseada no valor real
-            base_temp = weather_data["temperature"]
-            base_hum = weather_data["humidity"]
-            temp_variation = random.uniform(-3, 3)
-            hum_variation = random.randint(-10, 10)
-        else:
-            # Variação aleatória para mock
-            base_temp = random.uniform(10, 30)
-            base_hum = random.randint(40, 90)
-            temp_variation = random.uniform(-5, 5)
-            hum_variation = random.randint(-15, 15)
-        
-        temperatures.append(round(base_temp + temp_variation, 1))
-        humidities.append(max(20, min(100, base_hum + hum_variation)))
+async def dashboard(
+    request: Request,
+    city: str = "São Paulo",
+    hours: int = Query(6, ge=1, le=24 * 90),
+    db: AsyncSession = Depends(session.get_async_db)
+):
+    # Leitura do banco: as observações são gravadas pelo agendador de
+    # ingestão (TRACKED_CITIES), sem chamada ao provedor a cada visualização.
+    # Cidade ainda sem histórico é buscada uma vez (com cache) e gravada.
+    latest = await async_crud.get_latest_weather_record(db, city)
+    if latest is None:
+        weather_data = await get_weather_data(city)
+        if not weather_data.get("error"):
+            weather_writer.submit(weather_data)
+    else:
+        observed = latest.observed_at or latest.timestamp
+        if observed.tzinfo is None:
+            observed = observed.replace(tzinfo=timezone.utc)
+        weather_data = {
+            **latest.to_dict(),
+            "icon": latest.weather_icon,
+            "timestamp": observed.astimezone().strftime("%d/%m %H:%M")
+        }
+    has_error = weather_data.get("error", False)
     
+    # Gráfico com os agregados horários das últimas horas, limitado a
+    # DASHBOARD_MAX_POINTS pontos (LTTB) para qualquer intervalo
     chart_data = {
-        "times": times,
-        "temperatures": temperatures,
-        "humidities": humidities
+        "times": [],
+        "temperatures": [],
+        "humidities": []
     }
+    try:
+        now = datetime.now(timezone.utc)
+        rollups = await async_crud.get_rollups(db, city, crud.hour_bucket(now) - timedelta(hours=hours - 1), now, granularity="hour")
+        points = [rollup.to_dict() for rollup in rollups]
+        columns = {
+            "timestamp": [rollup.bucket for rollup in rollups],
+            "temperature": [point["temperature"]["mean"] for point in points],
+            "humidity": [point["humidity"]["mean"] for point in points]
+        }
+        columns = downsample_columns(columns, settings.DASHBOARD_MAX_POINTS, y_key="temperature")
+        time_format = "%H:00" if hours <= 24 else "%d/%m %H:00"
+        chart_data["times"] = [crud.hour_bucket(bucket).astimezone().strftime(time_format) for bucket in columns["timestamp"]]
+        chart_data["temperatures"] = columns["temperature"]
+        chart_data["humidities"] = columns["humidity"]
+    except Exception as e:
+        print(f"  Histórico indisponível: {e}")
     
     return templates.TemplateResponse(
         "dashboard.html",
@@ -250,6 +150,7 @@ async def dashboard(request: Request, city: str = "São Paulo"):
             "city": city,
             "weather_data": weather_data,
             "chart_data": chart_data,
+            "hours": hours,
             "has_error": has_error,  
             "api_key_configured": bool(OPENWEATHER_API_KEY and OPENWEATHER_API_KEY != "sua_chave_aqui")
         }
@@ -258,14 +159,97 @@ async def dashboard(request: Request, city: str = "São Paulo"):
 @app.get("/api/weather")
 async def api_weather(city: str = "London"):
     """Endpoint API para dados JSON"""
-    data = get_weather_data(city)
+    data = await get_weather_data(city)
     return data
 
+@app.post("/api/weather/batch", response_model=WeatherBatchResponse)
+async def api_weather_batch(payload: WeatherBatchRequest):
+    """Clima de várias cidades em uma única resposta"""
+    if len(payload.cities) > settings.BATCH_MAX_CITIES:
+        raise HTTPException(status_code=422, detail=f"Máximo de {settings.BATCH_MAX_CITIES} cidades por lote")
+    results = await get_weather_batch(payload.cities)
+    return {
+        "count": len(results),
+        "ok": sum(1 for item in results if item["status"] == "ok"),
+        "results": results
+    }
+
+# Rotas de API baseadas no banco (/api/weather/current, /history, /cities)
+app.include_router(endpoints.router)
+
+# Métricas lidas na hora da coleta a partir das estatísticas já existentes
+CACHES = {"weather": weather_cache, "trends": trends_cache, "analytics": analytics_cache}
+CACHE_EVENTS = ("hits", "stale_hits", "misses", "coalesced", "refreshes", "errors", "backend_errors")
+
+registry.callback(
+    "climatrends_cache_events_total", "Consultas aos caches por resultado",
+    lambda: [
+        ({"cache": name, "event": event}, stats[event])
+        for name, stats in ((name, cache.stats()) for name, cache in CACHES.items())
+        for event in CACHE_EVENTS
+    ],
+    kind="counter"
+)
+registry.callback(
+    "climatrends_cache_hit_ratio", "Fração das consultas servidas pelo cache",
+    lambda: [({"cache": name}, cache.stats()["hit_ratio"]) for name, cache in CACHES.items()]
+)
+registry.callback(
+    "climatrends_provider_circuit_open", "1 quando o circuit breaker do provedor está aberto",
+    lambda: [({"provider": name}, float(stats["state"] != "closed")) for name, stats in providers_stats().items()]
+)
+registry.callback(
+    "climatrends_db_pool_connections", "Conexões dos pools do banco por estado",
+    lambda: [
+        ({"engine": engine, "state": state}, stats[state])
+        for engine, stats in session.pool_stats().items()
+        for state in ("checkedout", "checkedin", "overflow") if state in stats
+    ]
+)
+registry.callback(
+    "climatrends_db_pool_saturation", "Conexões em uso / capacidade do pool",
+    lambda: [({"engine": engine}, stats.get("saturation")) for engine, stats in session.pool_stats().items()]
+)
+registry.callback(
+    "climatrends_writer_pending", "Observações aguardando gravação no writer",
+    lambda: [({}, weather_writer.pending())]
+)
+registry.callback(
+    "climatrends_writer_rows_total", "Observações processadas pelo writer",
+    lambda: [
+        ({"result": "written"}, weather_writer.written),
+        ({"result": "skipped"}, weather_writer.skipped),
+        ({"result": "dropped"}, weather_writer.dropped),
+        ({"result": "rejected"}, weather_writer.rejected)
+    ],
+    kind="counter"
+)
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Métricas no formato texto do Prometheus"""
+    return Response(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/health")
 def health():
     return {
         "status": "healthy", 
         "openweather_configured": bool(OPENWEATHER_API_KEY and OPENWEATHER_API_KEY != "sua_chave_aqui"),
+        "weather_cache": weather_cache.stats(),
+        "providers": providers_stats(),
+        "database_pool": session.pool_stats(),
+        "rate_limits": rate_limiter.usage(),
+        "ingestion": {
+            "tracked_cities": len(ingestion_scheduler.cities),
+            "last_saved": ingestion_scheduler.last_saved
+        },
+        "writer": {
+            "pending": weather_writer.pending(),
+            "written": weather_writer.written,
+            "skipped": weather_writer.skipped,
+            "dropped": weather_writer.dropped,
+            "rejected": weather_writer.rejected
+        },
         "timestamp": datetime.now().isoformat()
     }
 
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional
+from typing import Any, Dict, List, Optional
 
 class WeatherBase(BaseModel):
     city: str = Field(..., example="São Paulo")
@@ -18,8 +18,23 @@ class WeatherCreate(WeatherBase):
 
 class WeatherResponse(WeatherBase):
     id: int
+    observed_at: Optional[datetime] = None
     timestamp: Optional[datetime] = None
     created_at: Optional[datetime] = None
     
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class WeatherBatchRequest(BaseModel):
+    cities: List[str] = Field(..., min_length=1, example=["São Paulo", "Lisboa", "Tokyo"])
+
+class WeatherBatchItem(BaseModel):
+    city: str
+    status: str
+    data: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+class WeatherBatchResponse(BaseModel):
+    count: int
+    ok: int
+    results: List[WeatherBatchItem]
\ No newline at end of file
@@ -0,0 +1,169 @@
+from datetime import datetime
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.utils import normalize_city
+from app.database import async_crud
+from app.services.cache import TTLCache
+
+# Métricas de /api/weather/analytics
+ANALYTICS_METRICS = ("rolling", "daily_delta", "anomalies", "heat_index")
+
+# Resultados memorizados por (cidade, intervalo, métrica, parâmetros, versão).
+# A versão vem do catálogo de cidades, então qualquer observação nova da
+# cidade (gravada por qualquer worker) gera outra chave.
+analytics_cache = TTLCache(ttl=settings.ANALYTICS_CACHE_TTL, max_entries=settings.ANALYTICS_CACHE_MAX_ENTRIES, namespace="analytics")
+
+def _to_list(values) -> List[Any]:
+    """Array/Series para lista JSON (NaN vira None)"""
+    array = np.asarray(values, dtype=float)
+    return [None if np.isnan(v) else round(float(v), 3) for v in array]
+
+def _timestamps(index: pd.DatetimeIndex) -> List[str]:
+    return [ts.isoformat() for ts in index]
+
+async def load_frame(db: AsyncSession, city: str, start: datetime, end: datetime, fields: List[str]) -> pd.DataFrame:
+    """DataFrame indexado por timestamp, lido direto das colunas do banco"""
+    columns = await async_crud.get_weather_range_columns(db, city, start, end, fields)
+    index = pd.to_datetime(pd.Series(columns.pop("timestamp"), dtype=object), utc=True)
+    return pd.DataFrame({name: pd.to_numeric(pd.Series(values, dtype=object)) for name, values in columns.items()}).set_index(pd.DatetimeIndex(index))
+
+def heat_index(temperature_c, humidity) -> np.ndarray:
+    """Índice de calor (NOAA/Rothfusz) em °C, vetorizado"""
+    t = np.asarray(temperature_c, dtype=float) * 9 / 5 + 32
+    rh = np.asarray(humidity, dtype=float)
+    
+    simple = 0.5 * (t + 61.0 + (t - 68.0) * 1.2 + rh * 0.094)
+    full = (
+        -42.379 + 2.04901523 * t + 10.14333127 * rh - 0.22475541 * t * rh
+        - 0.00683783 * t ** 2 - 0.05481717 * rh ** 2 + 0.00122874 * t ** 2 * rh
+        + 0.00085282 * t * rh ** 2 - 0.00000199 * t ** 2 * rh ** 2
+    )
+    with np.errstate(invalid="ignore"):
+        dry = (rh < 13) & (t >= 80) & (t <= 112)
+        full = np.where(dry, full - ((13 - rh) / 4) * np.sqrt(np.clip(17 - np.abs(t - 95), 0, None) / 17), full)
+        humid = (rh > 85) & (t >= 80) & (t <= 87)
+        full = np.where(humid, full + ((rh - 85) / 10) * ((87 - t) / 5), full)
+        result = np.where((simple + t) / 2 >= 80, full, simple)
+    return (result - 32) * 5 / 9
+
+def compute_metric(frame: pd.DataFrame, metric: str, field: str, window: str, threshold: float) -> Dict[str, Any]:
+    if frame.empty:
+        return {"timestamp": [], "values": []}
+    
+    if metric == "heat_index":
+        values = heat_index(frame["temperature"].to_numpy(), frame["humidity"].to_numpy())
+        return {
+            "timestamp": _timestamps(frame.index),
+            "temperature": _to_list(frame["temperature"]),
+            "humidity": _to_list(frame["humidity"]),
+            "feels_like": _to_list(frame["feels_like"]),
+            "heat_index": _to_list(values)
+        }
+    
+    series = frame[field]
+    if metric == "daily_delta":
+        daily = series.resample("1D").mean()
+        return {
+            "timestamp": _timestamps(daily.index),
+            "mean": _to_list(daily),
+            "delta": _to_list(daily.diff())
+        }
+    
+    rolling = series.rolling(window, min_periods=1)
+    mean = rolling.mean()
+    if metric == "anomalies":
+        std = rolling.std()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            zscore = ((series - mean) / std).replace([np.inf, -np.inf], np.nan)
+        return {
+            "timestamp": _timestamps(series.index),
+            "values": _to_list(series),
+            "rolling_mean": _to_list(mean),
+            "zscore": _to_list(zscore),
+            "anomaly": (zscore.abs() > threshold).fillna(False).tolist()
+        }
+    
+    return {
+        "timestamp": _timestamps(series.index),
+        "values": _to_list(series),
+        "rolling_mean": _to_list(mean)
+    }
+
+async def get_analytics(
+    db: AsyncSession,
+    city: str,
+    start: datetime,
+    end: datetime,
+    metric: str,
+    field: str = "temperature",
+    window: str = "3h",
+    threshold: float = 3.0
+) -> Dict[str, Any]:
+    """Métrica analítica de uma cidade, memorizada até chegar dado novo"""
+    version = await async_crud.get_city_version(db, city)
+    key = ("analytics", normalize_city(city), start, end, metric, field, window, threshold, version)
+    cached = await analytics_cache.get(key)
+    if cached is not None:
+        return cached
+    
+    fields = ["temperature", "humidity", "feels_like"] if metric == "heat_index" else [field]
+    frame = await load_frame(db, city, start, end, fields)
+    result = {
+        "city": city,
+        "metric": metric,
+        "field": None if metric == "heat_index" else field,
+        "count": len(frame),
+        **compute_metric(frame, metric, field, window, threshold)
+    }
+    await analytics_cache.set(key, result)
+    return result
+
+async def compare_cities(
+    db: AsyncSession,
+    cities: List[str],
+    start: datetime,
+    end: datetime,
+    field: str = "temperature",
+    resample: str = "1h"
+) -> Dict[str, Any]:
+    """Séries de várias cidades alinhadas no mesmo eixo de tempo + resumo"""
+    versions = tuple([await async_crud.get_city_version(db, city) for city in cities])
+    key = ("compare", tuple(normalize_city(c) for c in cities), start, end, field, resample, versions)
+    cached = await analytics_cache.get(key)
+    if cached is not None:
+        return cached
+    
+    series = {}
+    for city in cities:
+        frame = await load_frame(db, city, start, end, [field])
+        series[city] = frame[field].resample(resample).mean() if not frame.empty else pd.Series(dtype=float)
+    aligned = pd.DataFrame(series)
+    
+    summary = {}
+    for city in cities:
+        column = aligned[city] if city in aligned else pd.Series(dtype=float)
+        summary[city] = {
+            "mean": _to_list([column.mean()])[0],
+            "min": _to_list([column.min()])[0],
+            "max": _to_list([column.max()])[0],
+            "samples": int(column.count())
+        }
+    
+    result = {
+        "field": field,
+        "resample": resample,
+        "timestamp": _timestamps(aligned.index),
+        "series": {city: _to_list(aligned[city]) for city in cities},
+        "summary": summary,
+        "correlation": {
+            city: {other: _to_list([value])[0] for other, value in row.items()}
+            for city, row in aligned.corr().to_dict(orient="index").items()
+        }
+    }
+    await analytics_cache.set(key, result)
+    return result
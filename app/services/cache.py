@@ -0,0 +1,152 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from app.core.config import settings
+from app.core.utils import normalize_city
+from app.services.cache_backends import CacheBackend, Entry, create_backend
+
+Fetcher = Callable[[], Awaitable[Optional[Any]]]
+
+def weather_cache_key(city: str, country: Optional[str], provider: str) -> Tuple[str, str, str]:
+    return (normalize_city(city), (country or "").upper(), provider)
+
+class TTLCache:
+    """Cache com TTL, stale-while-revalidate e coalescência de requisições
+
+    Dentro do TTL o valor é servido direto. Depois do TTL e até o fim da
+    janela ``stale_ttl`` o valor antigo é servido enquanto uma única
+    atualização roda em segundo plano. Misses concorrentes para a mesma
+    chave aguardam a mesma busca em andamento (single-flight).
+
+    Os valores ficam no backend de CACHE_BACKEND (memória do processo,
+    arquivo SQLite ou Redis), então com um backend compartilhado todos os
+    workers enxergam o que qualquer um deles buscou. A coalescência das
+    buscas em andamento continua sendo por processo. Leituras e escritas em
+    backends com I/O (SQLite, Redis) rodam fora do event loop.
+    """
+
+    def __init__(self, ttl: float, stale_ttl: float = 0, max_entries: int = 10000, namespace: str = "cache"):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        # Entradas vencidas continuam guardadas por um tempo para peek()
+        self.retention = max(ttl + stale_ttl, settings.CACHE_RETENTION)
+        self.backend: CacheBackend = create_backend(namespace, max_entries)
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._stats = {"hits": 0, "stale_hits": 0, "misses": 0, "coalesced": 0, "refreshes": 0, "errors": 0, "backend_errors": 0}
+
+    async def _run(self, method, *args):
+        if self.backend.blocking:
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+    async def _lookup(self, key: Hashable) -> Optional[Entry]:
+        try:
+            return await self._run(self.backend.get, key)
+        except Exception as e:
+            # Backend fora do ar vira miss, sem derrubar a requisição
+            self._stats["backend_errors"] += 1
+            print(f"  Backend de cache indisponível: {e}")
+            return None
+
+    async def get(self, key: Hashable, count_miss: bool = True) -> Optional[Any]:
+        """Valor em cache ainda dentro do TTL (sem buscar)
+
+        Conta hit ou miss nas estatísticas. ``count_miss=False`` é para
+        consultas seguidas de get_or_fetch, que já conta o miss.
+        """
+        entry = await self._lookup(key)
+        if entry and time.time() - entry[1] < self.ttl:
+            self._stats["hits"] += 1
+            return entry[0]
+        if count_miss:
+            self._stats["misses"] += 1
+        return None
+
+    async def peek(self, key: Hashable) -> Optional[Any]:
+        """Valor em cache com qualquer idade (último recurso, ex.: cota esgotada)"""
+        entry = await self._lookup(key)
+        return entry[0] if entry else None
+
+    async def set(self, key: Hashable, value: Any):
+        try:
+            await self._run(self.backend.set, key, value, self.retention)
+        except Exception as e:
+            self._stats["backend_errors"] += 1
+            print(f"  Falha ao gravar no cache: {e}")
+
+    async def invalidate(self, key: Hashable):
+        await self._run(self.backend.delete, key)
+
+    async def clear(self):
+        await self._run(self.backend.clear)
+
+    async def get_or_fetch(self, key: Hashable, fetcher: Fetcher) -> Optional[Any]:
+        entry = await self._lookup(key)
+        if entry is not None:
+            value, fetched_at = entry
+            age = time.time() - fetched_at
+            if age < self.ttl:
+                self._stats["hits"] += 1
+                return value
+            if age < self.ttl + self.stale_ttl:
+                self._stats["stale_hits"] += 1
+                if key not in self._inflight:
+                    self._stats["refreshes"] += 1
+                    self._start_fetch(key, fetcher)
+                return value
+        
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self._stats["coalesced"] += 1
+            return await asyncio.shield(inflight)
+        
+        self._stats["misses"] += 1
+        return await asyncio.shield(self._start_fetch(key, fetcher))
+
+    def _start_fetch(self, key: Hashable, fetcher: Fetcher) -> asyncio.Future:
+        task = asyncio.ensure_future(self._fetch(key, fetcher))
+        self._inflight[key] = task
+        return task
+
+    async def _fetch(self, key: Hashable, fetcher: Fetcher) -> Optional[Any]:
+        try:
+            value = await fetcher()
+            # Falhas (None) não são cacheadas para que a próxima chamada tente de novo
+            if value is not None:
+                await self.set(key, value)
+            return value
+        except Exception as e:
+            self._stats["errors"] += 1
+            print(f"  Falha ao atualizar cache {key}: {e}")
+            return None
+        finally:
+            self._inflight.pop(key, None)
+
+    def _size(self) -> Optional[int]:
+        try:
+            return self.backend.size()
+        except Exception:
+            return None
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._stats["hits"] + self._stats["stale_hits"] + self._stats["misses"] + self._stats["coalesced"]
+        served = lookups - self._stats["misses"]
+        return {
+            **self._stats,
+            "backend": type(self.backend).__name__,
+            "entries": self._size(),
+            "inflight": len(self._inflight),
+            "hit_ratio": round(served / lookups, 4) if lookups else 0.0
+        }
+
+# Cache de condições atuais, chave (cidade, país, provedor)
+weather_cache = TTLCache(
+    ttl=settings.WEATHER_CACHE_TTL,
+    stale_ttl=settings.WEATHER_CACHE_STALE_TTL,
+    max_entries=settings.WEATHER_CACHE_MAX_ENTRIES,
+    namespace="weather"
+)
+
+# Tendências calculadas a partir dos agregados; a chave inclui a versão da cidade
+trends_cache = TTLCache(ttl=settings.TRENDS_CACHE_TTL, max_entries=settings.TRENDS_CACHE_MAX_ENTRIES, namespace="trends")
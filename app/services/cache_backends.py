@@ -0,0 +1,302 @@
+import json
+import os
+import random
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Hashable, Iterable, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+from app.core.config import settings
+
+Entry = Tuple[Any, float]
+
+def _encode_default(value: Any):
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    if isinstance(value, date):
+        return {"__date__": value.isoformat()}
+    if hasattr(value, "tolist"):
+        # Escalares e arrays do NumPy
+        return value.tolist()
+    raise TypeError(f"Valor não serializável no cache: {type(value).__name__}")
+
+def _decode_hook(data: dict):
+    if len(data) == 1:
+        if "__datetime__" in data:
+            return datetime.fromisoformat(data["__datetime__"])
+        if "__date__" in data:
+            return date.fromisoformat(data["__date__"])
+    return data
+
+def dumps_value(value: Any) -> bytes:
+    """Serializa para os backends compartilhados (JSON; datetimes preservados)
+
+    JSON e não pickle: quem consegue escrever no Redis ou no arquivo não
+    consegue executar código nos workers. Tuplas voltam como listas.
+    """
+    return json.dumps(value, default=_encode_default, separators=(",", ":")).encode()
+
+def loads_value(data: bytes) -> Any:
+    return json.loads(data, object_hook=_decode_hook)
+
+class CacheBackend:
+    """Armazenamento dos caches: valores com o horário (epoch) em que foram gravados
+
+    ``ttl`` é o tempo de retenção no armazenamento; a decisão de fresco ou
+    antigo fica com quem usa o cache. ``ttl=None`` guarda sem expiração.
+    ``blocking`` indica I/O síncrono (arquivo, rede), que o código
+    assíncrono deve rodar fora do event loop.
+    """
+
+    blocking = True
+
+    def get(self, key: Hashable) -> Optional[Entry]:
+        raise NotImplementedError
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        self.set_many([(key, value)], ttl)
+
+    def set_many(self, items: Iterable[Tuple[Hashable, Any]], ttl: Optional[float] = None):
+        raise NotImplementedError
+
+    def delete(self, key: Hashable):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def size(self) -> Optional[int]:
+        return None
+
+class MemoryBackend(CacheBackend):
+    """LRU em memória do processo (padrão; não compartilha entre workers)"""
+
+    blocking = False
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[Any, float, Optional[float]]]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Entry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, stored_at, expires_at = entry
+        if expires_at is not None and time.time() >= expires_at:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value, stored_at
+
+    def set_many(self, items: Iterable[Tuple[Hashable, Any]], ttl: Optional[float] = None):
+        now = time.time()
+        expires_at = now + ttl if ttl is not None else None
+        for key, value in items:
+            self._entries[key] = (value, now, expires_at)
+            self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def size(self) -> Optional[int]:
+        return len(self._entries)
+
+class SQLiteBackend(CacheBackend):
+    """Arquivo SQLite local compartilhado pelos workers do mesmo host"""
+
+    def __init__(self, path: str, namespace: str):
+        self.path = path
+        self.namespace = namespace
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " key TEXT PRIMARY KEY, value BLOB NOT NULL, stored_at REAL NOT NULL, expires_at REAL)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def _key(self, key: Hashable) -> str:
+        return f"{self.namespace}:{key!r}"
+
+    def get(self, key: Hashable) -> Optional[Entry]:
+        row = self._connection().execute(
+            "SELECT value, stored_at FROM cache WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (self._key(key), time.time())
+        ).fetchone()
+        return (loads_value(row[0]), row[1]) if row else None
+
+    def set_many(self, items: Iterable[Tuple[Hashable, Any]], ttl: Optional[float] = None):
+        now = time.time()
+        expires_at = now + ttl if ttl is not None else None
+        rows = [(self._key(key), dumps_value(value), now, expires_at) for key, value in items]
+        conn = self._connection()
+        with conn:
+            conn.execute("BEGIN")
+            conn.executemany("INSERT OR REPLACE INTO cache (key, value, stored_at, expires_at) VALUES (?, ?, ?, ?)", rows)
+            # Limpeza ocasional das entradas expiradas
+            if random.random() < 0.01:
+                conn.execute("DELETE FROM cache WHERE expires_at <= ?", (now,))
+
+    def delete(self, key: Hashable):
+        self._connection().execute("DELETE FROM cache WHERE key = ?", (self._key(key),))
+
+    def clear(self):
+        prefix = f"{self.namespace}:"
+        self._connection().execute("DELETE FROM cache WHERE substr(key, 1, ?) = ?", (len(prefix), prefix))
+
+    def size(self) -> Optional[int]:
+        prefix = f"{self.namespace}:"
+        return self._connection().execute(
+            "SELECT count(*) FROM cache WHERE substr(key, 1, ?) = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (len(prefix), prefix, time.time())
+        ).fetchone()[0]
+
+class RedisError(Exception):
+    pass
+
+class RedisConnection:
+    """Cliente mínimo do protocolo RESP (Redis ou compatível)"""
+
+    def __init__(self, url: str, timeout: float = 2.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.strip("/") or 0)
+        self.timeout = timeout
+        self._sock: Optional[socket.socket] = None
+        self._file = None
+
+    def _connect(self):
+        self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._file = self._sock.makefile("rb")
+        if self.password:
+            self._roundtrip([("AUTH", self.password)])
+        if self.db:
+            self._roundtrip([("SELECT", self.db)])
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+        self._sock = self._file = None
+
+    @staticmethod
+    def _encode(args) -> bytes:
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        return b"".join(parts)
+
+    def _read(self):
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError("Conexão com o Redis encerrada")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode()
+        if kind == b"-":
+            raise RedisError(payload.decode())
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = self._file.read(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            length = int(payload)
+            return None if length < 0 else [self._read() for _ in range(length)]
+        raise RedisError(f"Resposta inesperada: {line!r}")
+
+    def _roundtrip(self, commands):
+        self._sock.sendall(b"".join(self._encode(args) for args in commands))
+        return [self._read() for _ in commands]
+
+    def pipeline(self, commands):
+        """Envia vários comandos de uma vez e devolve as respostas"""
+        if self._sock is None:
+            self._connect()
+        try:
+            return self._roundtrip(commands)
+        except (OSError, ConnectionError):
+            # Uma nova tentativa com conexão nova (ex.: servidor reiniciado)
+            self.close()
+            self._connect()
+            return self._roundtrip(commands)
+
+    def command(self, *args):
+        return self.pipeline([args])[0]
+
+class RedisBackend(CacheBackend):
+    """Redis (ou servidor compatível com RESP) compartilhado entre workers e hosts"""
+
+    def __init__(self, url: str, namespace: str):
+        self.url = url
+        self.prefix = f"climatrends:{namespace}:"
+        self._local = threading.local()
+
+    def _redis(self) -> RedisConnection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = RedisConnection(self.url)
+        return conn
+
+    def _key(self, key: Hashable) -> str:
+        return f"{self.prefix}{key!r}"
+
+    def get(self, key: Hashable) -> Optional[Entry]:
+        data = self._redis().command("GET", self._key(key))
+        if data is None:
+            return None
+        value, stored_at = loads_value(data)
+        return value, stored_at
+
+    def set_many(self, items: Iterable[Tuple[Hashable, Any]], ttl: Optional[float] = None):
+        now = time.time()
+        expiry = ("PX", max(1, int(ttl * 1000))) if ttl is not None else ()
+        commands = [("SET", self._key(key), dumps_value([value, now]), *expiry) for key, value in items]
+        if commands:
+            self._redis().pipeline(commands)
+
+    def delete(self, key: Hashable):
+        self._redis().command("DEL", self._key(key))
+
+    def clear(self):
+        cursor = b"0"
+        while True:
+            cursor, keys = self._redis().command("SCAN", cursor, "MATCH", f"{self.prefix}*", "COUNT", 1000)
+            if keys:
+                self._redis().command("DEL", *keys)
+            if cursor in (b"0", "0"):
+                break
+
+def create_backend(namespace: str, max_entries: int = 10000) -> CacheBackend:
+    """Backend configurado em CACHE_BACKEND: memory, sqlite[:caminho] ou redis://..."""
+    backend = settings.CACHE_BACKEND.strip()
+    if backend.startswith("redis://"):
+        return RedisBackend(backend, namespace)
+    if backend.startswith("sqlite"):
+        path = backend.partition(":")[2] or os.path.join(tempfile.gettempdir(), "climatrends_cache.sqlite3")
+        return SQLiteBackend(path, namespace)
+    return MemoryBackend(max_entries)
@@ -0,0 +1,96 @@
+from typing import Dict, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+def _as_float_array(values: Sequence) -> np.ndarray:
+    return np.array([np.nan if v is None else v for v in values], dtype=float)
+
+def time_axis(timestamps: Sequence) -> np.ndarray:
+    """Timestamps (datetime/ISO) para segundos desde a época, vetorizado"""
+    return pd.to_datetime(pd.Series(timestamps), utc=True).astype("int64").to_numpy() / 1e9
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: índices dos pontos mantidos
+
+    Primeiro e último ponto são sempre mantidos; os demais são divididos
+    em ``threshold - 2`` baldes e de cada um fica o ponto que forma o maior
+    triângulo com o ponto escolhido no balde anterior e a média do próximo.
+    As áreas de cada balde são calculadas de forma vetorizada.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    
+    y = np.where(np.isnan(y), np.nanmean(y) if np.isfinite(y).any() else 0.0, y)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    selected = np.empty(threshold, dtype=int)
+    selected[0] = 0
+    selected[-1] = n - 1
+    
+    previous = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_start:next_end].mean() if next_end > next_start else x[-1]
+        avg_y = y[next_start:next_end].mean() if next_end > next_start else y[-1]
+        
+        areas = np.abs(
+            (x[previous] - avg_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (avg_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas)) if end > start else start
+        selected[i + 1] = previous
+    
+    return np.unique(selected)
+
+def minmax(y: np.ndarray, threshold: int) -> np.ndarray:
+    """Mínimo e máximo de cada balde (preserva picos), sem laço em Python"""
+    n = len(y)
+    if threshold >= n or threshold < 2:
+        return np.arange(n)
+    
+    buckets = np.arange(n) * (threshold // 2) // n
+    index = np.arange(n)
+    low = np.where(np.isnan(y), np.inf, y)
+    high = np.where(np.isnan(y), -np.inf, y)
+    
+    # Ordena por (balde, valor): o primeiro de cada balde é o mínimo e o último o máximo
+    order_min = np.lexsort((low, buckets))
+    order_max = np.lexsort((high, buckets))
+    starts = np.r_[0, np.flatnonzero(np.diff(buckets[order_min])) + 1]
+    ends = np.r_[starts[1:], n] - 1
+    selected = np.concatenate([index[order_min[starts]], index[order_max[ends]]])
+    return np.unique(selected)
+
+def downsample_columns(
+    columns: Dict[str, list],
+    points: int,
+    y_key: str,
+    x_key: str = "timestamp",
+    method: str = "lttb"
+) -> Dict[str, list]:
+    """Reduz todas as colunas aos índices escolhidos pela série ``y_key``"""
+    n = len(columns.get(x_key) or [])
+    if not n or points >= n:
+        return columns
+    
+    y = _as_float_array(columns[y_key])
+    if method == "minmax":
+        selected = minmax(y, points)
+    else:
+        selected = lttb(time_axis(columns[x_key]), y, points)
+    
+    return {key: [values[i] for i in selected] for key, values in columns.items()}
+
+def downsample_records(records: List[dict], points: int, value, method: str = "lttb", x_key: str = "bucket") -> List[dict]:
+    """Versão para listas de dicts; ``value`` extrai o valor numérico de cada item"""
+    if points >= len(records):
+        return records
+    columns = {
+        x_key: [r[x_key] for r in records],
+        "_value": [value(r) for r in records],
+        "_index": list(range(len(records)))
+    }
+    reduced = downsample_columns(columns, points, "_value", x_key=x_key, method=method)
+    return [records[i] for i in reduced["_index"]]
@@ -0,0 +1,112 @@
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Iterable, Iterator, List
+
+from sqlalchemy import DateTime, Float, Integer
+
+from app.database import crud
+from app.database.models import WeatherRecord
+from app.database.session import SessionLocal
+
+# Formatos aceitos pela exportação e seus content-types
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet"
+}
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def _serialize(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def stream_weather_export(fmt: str, **filters) -> Iterator[bytes]:
+    """Gera o arquivo de exportação bloco a bloco
+
+    A sessão é aberta aqui (e não via Depends) porque o corpo da resposta
+    é produzido depois que o endpoint retorna.
+    """
+    db = SessionLocal()
+    try:
+        chunks = crud.iter_weather_rows(db, chunk_size=5000, **filters)
+        if fmt == "csv":
+            yield from _csv_chunks(chunks)
+        elif fmt == "parquet":
+            yield from _parquet_chunks(chunks)
+        else:
+            yield from _ndjson_chunks(chunks)
+    finally:
+        db.close()
+
+def _ndjson_chunks(chunks: Iterable[List[tuple]]) -> Iterator[bytes]:
+    columns = crud.EXPORT_COLUMNS
+    for rows in chunks:
+        lines = [
+            json.dumps(dict(zip(columns, map(_serialize, row))), ensure_ascii=False)
+            for row in rows
+        ]
+        yield ("\n".join(lines) + "\n").encode()
+
+def _csv_chunks(chunks: Iterable[List[tuple]]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(crud.EXPORT_COLUMNS)
+    for rows in chunks:
+        writer.writerows([[_serialize(value) for value in row] for row in rows])
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+def _parquet_schema():
+    """Schema do arquivo a partir dos tipos das colunas (e não do primeiro bloco,
+    em que uma coluna toda nula viraria do tipo null)"""
+    import pyarrow as pa
+
+    fields = []
+    for name in crud.EXPORT_COLUMNS:
+        column_type = WeatherRecord.__table__.c[name].type
+        if isinstance(column_type, DateTime):
+            arrow_type = pa.timestamp("us", tz="UTC")
+        elif isinstance(column_type, Integer):
+            arrow_type = pa.int64()
+        elif isinstance(column_type, Float):
+            arrow_type = pa.float64()
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(name, arrow_type))
+    return pa.schema(fields)
+
+def _parquet_chunks(chunks: Iterable[List[tuple]]) -> Iterator[bytes]:
+    """Um row group por bloco; os bytes são repassados assim que escritos"""
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    
+    schema = _parquet_schema()
+    sink = io.BytesIO()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        for rows in chunks:
+            frame = pd.DataFrame.from_records(rows, columns=crud.EXPORT_COLUMNS)
+            for column in ("observed_at", "timestamp"):
+                frame[column] = pd.to_datetime(frame[column], utc=True)
+            writer.write_table(pa.Table.from_pandas(frame, schema=schema, preserve_index=False))
+            yield _drain(sink)
+    finally:
+        writer.close()
+    yield _drain(sink)
+
+def _drain(sink: io.BytesIO) -> bytes:
+    data = sink.getvalue()
+    sink.seek(0)
+    sink.truncate()
+    return data
@@ -0,0 +1,141 @@
+import asyncio
+import time
+from typing import Optional, Dict, Any, List, Tuple
+
+from app.core.config import settings
+from app.core.metrics import GEOCODER_REQUEST_DURATION, record_stage
+from app.core.utils import normalize_city
+from app.database import crud
+from app.database.session import SessionLocal
+from app.services.http_client import get_http_client
+from app.services.cache_backends import create_backend
+from app.services.resilience import NOT_FOUND_STATUS, ProviderError
+
+class GeocodeCache:
+    """Cache de coordenadas por cidade normalizada (backend de CACHE_BACKEND)
+
+    Coordenadas não mudam, então as entradas não expiram; no backend em
+    memória o tamanho é limitado por LRU.
+    """
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self.backend = create_backend("geocode", max_size)
+
+    def get_sync(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            entry = self.backend.get(key)
+        except Exception as e:
+            print(f"  Backend de cache indisponível: {e}")
+            return None
+        return entry[0] if entry else None
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        # Backends com I/O (SQLite, Redis) rodam fora do event loop
+        if self.backend.blocking:
+            return await asyncio.to_thread(self.get_sync, key)
+        return self.get_sync(key)
+
+    async def put(self, key: str, location: Dict[str, Any]):
+        if self.backend.blocking:
+            await asyncio.to_thread(self.put_many, [(key, location)])
+        else:
+            self.put_many([(key, location)])
+
+    def put_many(self, items: List[Tuple[str, Dict[str, Any]]]):
+        try:
+            self.backend.set_many(items)
+        except Exception as e:
+            print(f"  Falha ao gravar no cache de geocoding: {e}")
+
+    def __len__(self):
+        return self.backend.size() or 0
+
+geocode_cache = GeocodeCache(settings.GEOCODE_CACHE_SIZE)
+
+def _load_from_db(city_key: str) -> Optional[Dict[str, Any]]:
+    db = SessionLocal()
+    try:
+        entry = crud.get_geocode(db, city_key)
+        return entry.to_dict() if entry else None
+    except Exception as e:
+        print(f"  Cache de geocoding indisponível: {e}")
+        return None
+    finally:
+        db.close()
+
+def _save_to_db(city_key: str, location: Dict[str, Any]):
+    db = SessionLocal()
+    try:
+        crud.save_geocode(db, city_key, location)
+    except Exception as e:
+        print(f"  Falha ao salvar geocoding: {e}")
+    finally:
+        db.close()
+
+async def fetch_geocode(city: str) -> Optional[Dict[str, Any]]:
+    """Consulta a API de geocoding do Open-Meteo (None se a cidade não existe)"""
+    geo_params = {
+        "name": city,
+        "count": 1,
+        "language": "pt",
+        "format": "json"
+    }
+    
+    started = time.monotonic()
+    try:
+        geo_response = await get_http_client().get(settings.OPENMETEO_GEOCODING_URL, params=geo_params)
+    except Exception:
+        GEOCODER_REQUEST_DURATION.observe(time.monotonic() - started, outcome="exception")
+        raise
+    elapsed = time.monotonic() - started
+    GEOCODER_REQUEST_DURATION.observe(elapsed, outcome="ok" if geo_response.status_code == 200 else "error")
+    record_stage("geocoder", elapsed)
+    
+    if geo_response.status_code in NOT_FOUND_STATUS:
+        return None
+    if geo_response.status_code != 200:
+        raise ProviderError(f"Geocoding erro {geo_response.status_code}")
+    
+    geo_data = geo_response.json()
+    if geo_data.get("results"):
+        result = geo_data["results"][0]
+        return {
+            "name": result["name"],
+            "country": result.get("country_code", ""),
+            "latitude": result["latitude"],
+            "longitude": result["longitude"]
+        }
+    return None
+
+async def geocode_city(city: str) -> Optional[Dict[str, Any]]:
+    """Resolve coordenadas: memória -> banco -> API de geocoding"""
+    city_key = normalize_city(city)
+    
+    location = await geocode_cache.get(city_key)
+    if location:
+        return location
+    
+    location = await asyncio.to_thread(_load_from_db, city_key)
+    if location:
+        await geocode_cache.put(city_key, location)
+        return location
+    
+    location = await fetch_geocode(city)
+    if location:
+        await geocode_cache.put(city_key, location)
+        await asyncio.to_thread(_save_to_db, city_key, location)
+    return location
+
+def warm_geocode_cache(limit: Optional[int] = None) -> int:
+    """Carrega as coordenadas já conhecidas do banco para o cache"""
+    db = SessionLocal()
+    try:
+        entries = crud.get_geocodes(db, limit=limit or settings.GEOCODE_WARM_LIMIT)
+        geocode_cache.put_many([(entry.city_key, entry.to_dict()) for entry in reversed(entries)])
+        return len(entries)
+    except Exception as e:
+        print(f"  Não foi possível aquecer o cache de geocoding: {e}")
+        return 0
+    finally:
+        db.close()
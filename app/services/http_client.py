@@ -0,0 +1,27 @@
+import httpx
+from typing import Optional
+from app.core.config import settings
+
+# Cliente único por processo: reaproveita conexões TCP/TLS entre requisições
+_client: Optional[httpx.AsyncClient] = None
+
+def get_http_client() -> httpx.AsyncClient:
+    """Retorna o cliente HTTP assíncrono compartilhado"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=settings.HTTP_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=settings.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY
+            )
+        )
+    return _client
+
+async def close_http_client():
+    """Fecha o pool de conexões (chamado no shutdown da aplicação)"""
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
@@ -0,0 +1,289 @@
+import asyncio
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Tuple
+from dotenv import load_dotenv
+
+from app.core.config import settings
+from app.services.http_client import get_http_client
+from app.services.geocoding import geocode_city
+from app.services.cache import weather_cache, weather_cache_key
+from app.services.weather_codes import WEATHER_CODES, get_icon_from_code, parse_openmeteo_time
+from app.services.resilience import NOT_FOUND_STATUS, ProviderError, first_success, order_providers, provider_health
+from app.services.rate_limit import acquire, bucket_name, exhausted, guarded, rate_limiter
+from app.core.metrics import PROVIDER_REQUEST_DURATION, WEATHER_FALLBACKS, record_stage
+
+# Carregar variáveis de ambiente
+load_dotenv()
+
+# Configurações da API OpenWeather
+OPENWEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY", "").strip()
+OPENWEATHER_URL = f"{settings.OPENWEATHER_URL}/weather"
+
+# Buckets de rate limit de cada provedor (OpenWeather por chave de API)
+PROVIDER_BUCKETS = {
+    "openweathermap": bucket_name("openweathermap", OPENWEATHER_API_KEY),
+    "openmeteo": "openmeteo"
+}
+
+# Variáveis "current" pedidas ao Open-Meteo
+OPENMETEO_CURRENT_FIELDS = "temperature_2m,relative_humidity_2m,pressure_msl,wind_speed_10m,weather_code"
+
+def openweather_configured() -> bool:
+    return bool(OPENWEATHER_API_KEY and OPENWEATHER_API_KEY != "sua_chave_aqui")
+
+if openweather_configured():
+    rate_limiter.configure(PROVIDER_BUCKETS["openweathermap"], settings.OPENWEATHER_RATE_PER_MINUTE, settings.OPENWEATHER_RATE_PER_DAY)
+rate_limiter.configure(PROVIDER_BUCKETS["openmeteo"], settings.OPENMETEO_RATE_PER_MINUTE, settings.OPENMETEO_RATE_PER_DAY)
+
+async def get_weather_data(city: str):
+    """Busca dados de clima """
+    
+    print(f"\n Buscando clima para: {city}")
+    
+    # OpenWeather só entra com chave válida; Open-Meteo não precisa de chave.
+    # A ordem se adapta à latência observada de cada provedor.
+    names = (["openweathermap"] if openweather_configured() else []) + ["openmeteo"]
+    calls = [(name, provider_call(name, city)) for name in order_providers(names)]
+    
+    result = await first_success(calls)
+    if result:
+        return result
+    
+    # Por último: retorna mock data
+    print(f"  Todas as APIs falharam, usando dados mock")
+    WEATHER_FALLBACKS.inc(reason="mock_data")
+    return get_mock_data(city, "APIs indisponíveis")
+
+def provider_call(name: str, city: str):
+    """Consulta a um provedor passando por cache, circuit breaker e rate limit"""
+    key = weather_cache_key(city, None, name)
+    bucket = PROVIDER_BUCKETS[name]
+    fetcher = guarded(name, bucket, lambda: PROVIDER_FETCHERS[name](city))
+    
+    async def call():
+        cached = await weather_cache.get(key, count_miss=False)
+        if cached is not None:
+            return cached
+        if not provider_health(name).available():
+            print(f"  {name} com circuito aberto, pulando")
+            WEATHER_FALLBACKS.inc(reason="circuit_open")
+            return None
+        result = await weather_cache.get_or_fetch(key, fetcher)
+        if result is None and await exhausted(bucket):
+            # Cota esgotada: um dado antigo em cache é melhor que o mock
+            result = await weather_cache.peek(key)
+            if result is not None:
+                WEATHER_FALLBACKS.inc(reason="stale_cache")
+        return result
+    return call
+
+async def try_openweather(city: str):
+    """Tenta OpenWeather API (None se a cidade não existe; exceção se o provedor falhar)"""
+    params = {
+        "q": city.replace(" ", "%20"),
+        "appid": OPENWEATHER_API_KEY,
+        "units": "metric",
+        "lang": "pt_br"
+    }
+    
+    response = await get_http_client().get(OPENWEATHER_URL, params=params)
+    
+    if response.status_code == 200:
+        data = response.json()
+        print(f"   OpenWeather: {data['main']['temp']}°C")
+        return parse_openweather_data(data, city)
+    if response.status_code in NOT_FOUND_STATUS:
+        print(f"  OpenWeather: cidade não encontrada ({city})")
+        return None
+    raise ProviderError(f"OpenWeather erro {response.status_code}")
+
+async def try_openmeteo(city: str):
+    """Usa Open-Meteo API (gratuita, sem chave); None se a cidade não existe"""
+    # Coordenadas vêm do cache de geocoding (memória/banco) quando possível
+    location = await geocode_city(city)
+    if not location:
+        print(f"  Open-Meteo: cidade não encontrada ({city})")
+        return None
+    
+    # Agora busca dados climáticos
+    weather_params = {
+        "latitude": location["latitude"],
+        "longitude": location["longitude"],
+        "current": OPENMETEO_CURRENT_FIELDS,
+        "timezone": "auto"
+    }
+    
+    weather_response = await get_http_client().get(settings.OPENMETEO_FORECAST_URL, params=weather_params)
+    if weather_response.status_code != 200:
+        raise ProviderError(f"Open-Meteo erro {weather_response.status_code}")
+    
+    payload = weather_response.json()
+    weather_data = payload["current"]
+    print(f"   Open-Meteo: {weather_data['temperature_2m']}°C")
+    return parse_openmeteo_data(weather_data, location, payload.get("utc_offset_seconds", 0))
+
+async def get_weather_batch(cities: List[str]) -> List[Dict[str, Any]]:
+    """Busca clima de várias cidades de uma vez
+
+    As coordenadas são resolvidas em paralelo (via cache de geocoding) e o
+    Open-Meteo é consultado com uma única requisição por bloco de cidades,
+    usando listas de latitude/longitude separadas por vírgula. Cidades que
+    falharem caem para chamadas concorrentes ao OpenWeather.
+    """
+    print(f"\n Buscando clima em lote para {len(cities)} cidades")
+    
+    unique_cities = list(dict.fromkeys(city.strip() for city in cities if city.strip()))
+    results: Dict[str, Dict[str, Any]] = {}
+    semaphore = asyncio.Semaphore(settings.BATCH_CONCURRENCY)
+    
+    # Cidades já em cache não geram chamadas externas
+    pending = []
+    for city in unique_cities:
+        # Um evento (hit ou miss) por cidade nas estatísticas do cache
+        cached = await weather_cache.get(weather_cache_key(city, None, "openmeteo"), count_miss=not openweather_configured())
+        if cached is None and openweather_configured():
+            cached = await weather_cache.get(weather_cache_key(city, None, "openweathermap"))
+        if cached is not None:
+            results[city] = cached
+        else:
+            pending.append(city)
+    
+    async def resolve(city):
+        async with semaphore:
+            try:
+                return city, await geocode_city(city)
+            except Exception as e:
+                print(f"  Geocoding falhou para {city}: {e}")
+                return city, None
+    
+    located = [(city, location) for city, location in await asyncio.gather(*[resolve(c) for c in pending]) if location]
+    
+    chunk_size = settings.BATCH_OPENMETEO_CHUNK_SIZE
+    chunks = [located[i:i + chunk_size] for i in range(0, len(located), chunk_size)]
+    for chunk_results in await asyncio.gather(*[fetch_openmeteo_many(chunk) for chunk in chunks]):
+        results.update(chunk_results)
+    
+    # Fallback: OpenWeather por cidade, em paralelo
+    missing = [city for city in pending if city not in results]
+    if missing and openweather_configured():
+        async def fallback(city):
+            async with semaphore:
+                return city, await provider_call("openweathermap", city)()
+        for city, data in await asyncio.gather(*[fallback(c) for c in missing]):
+            if data and not data.get("error"):
+                results[city] = data
+    
+    batch = []
+    for city in unique_cities:
+        data = results.get(city)
+        if data:
+            batch.append({"city": city, "status": "ok", "data": data})
+        else:
+            batch.append({"city": city, "status": "error", "error": "Cidade não encontrada ou APIs indisponíveis"})
+    return batch
+
+async def fetch_openmeteo_many(located: List[Tuple[str, Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+    """Uma única requisição ao Open-Meteo para várias coordenadas"""
+    if not located:
+        return {}
+    # O Open-Meteo contabiliza cada coordenada como uma chamada
+    if not await acquire(PROVIDER_BUCKETS["openmeteo"], cost=len(located)):
+        return {}
+    try:
+        weather_params = {
+            "latitude": ",".join(str(location["latitude"]) for _, location in located),
+            "longitude": ",".join(str(location["longitude"]) for _, location in located),
+            "current": OPENMETEO_CURRENT_FIELDS,
+            "timezone": "auto"
+        }
+        
+        started = time.monotonic()
+        response = await get_http_client().get(settings.OPENMETEO_FORECAST_URL, params=weather_params)
+        elapsed = time.monotonic() - started
+        PROVIDER_REQUEST_DURATION.observe(elapsed, provider="openmeteo_batch", outcome="ok" if response.status_code == 200 else "error")
+        record_stage("provider:openmeteo_batch", elapsed)
+        if response.status_code != 200:
+            print(f"  Open-Meteo lote erro {response.status_code}")
+            return {}
+        
+        payload = response.json()
+        # Com uma só coordenada a API devolve um objeto em vez de lista
+        if isinstance(payload, dict):
+            payload = [payload]
+        
+        results = {}
+        for (city, location), item in zip(located, payload):
+            data = parse_openmeteo_data(item["current"], location, item.get("utc_offset_seconds", 0))
+            await weather_cache.set(weather_cache_key(city, None, "openmeteo"), data)
+            results[city] = data
+        return results
+        
+    except Exception as e:
+        print(f"  Open-Meteo lote falhou: {e}")
+        return {}
+
+def parse_openmeteo_data(weather_data, location, utc_offset_seconds: int = 0):
+    """Parse bloco "current" do Open-Meteo"""
+    return {
+        "city": location["name"],
+        "country": location.get("country", ""),
+        "latitude": location.get("latitude"),
+        "longitude": location.get("longitude"),
+        "temperature": weather_data["temperature_2m"],
+        "feels_like": weather_data["temperature_2m"],
+        "humidity": weather_data["relative_humidity_2m"],
+        "pressure": weather_data["pressure_msl"],
+        "description": WEATHER_CODES.get(weather_data.get("weather_code", 0), "Desconhecido"),
+        "wind_speed": weather_data["wind_speed_10m"],
+        "icon": get_icon_from_code(weather_data.get("weather_code", 0)),
+        "timestamp": datetime.now().strftime("%H:%M"),
+        "observed_at": parse_openmeteo_time(weather_data.get("time"), utc_offset_seconds),
+        "error": False,
+        "source": "openmeteo"
+    }
+
+def parse_openweather_data(data, city):
+    """Parse dados OpenWeather"""
+    return {
+        "city": data.get("name", city),
+        "country": data.get("sys", {}).get("country", ""),
+        "latitude": data.get("coord", {}).get("lat"),
+        "longitude": data.get("coord", {}).get("lon"),
+        "temperature": data.get("main", {}).get("temp", 0),
+        "feels_like": data.get("main", {}).get("feels_like", 0),
+        "humidity": data.get("main", {}).get("humidity", 0),
+        "pressure": data.get("main", {}).get("pressure", 0),
+        "description": data.get("weather", [{}])[0].get("description", "").capitalize(),
+        "wind_speed": data.get("wind", {}).get("speed", 0),
+        "icon": data.get("weather", [{}])[0].get("icon", "01d"),
+        "timestamp": datetime.now().strftime("%H:%M"),
+        "observed_at": datetime.fromtimestamp(data["dt"], tz=timezone.utc) if data.get("dt") else None,
+        "error": False,
+        "source": "openweathermap"
+    }
+
+def get_mock_data(city: str, reason: str = "APIs indisponíveis"):
+    """Retorna dados fixos quando as APIs não respondem"""
+    return {
+        "city": city,
+        "country": "XX",
+        "temperature": None,
+        "feels_like": None,
+        "humidity": None,
+        "pressure": None,
+        "description": "Dados indisponíveis",
+        "wind_speed": None,
+        "icon": "01d",
+        "timestamp": datetime.now().strftime("%H:%M"),
+        "error": True,
+        "error_message": reason,
+        "source": "fallback"
+    }
+
+# Funções de consulta de cada provedor (usadas por provider_call)
+PROVIDER_FETCHERS = {
+    "openweathermap": try_openweather,
+    "openmeteo": try_openmeteo
+}
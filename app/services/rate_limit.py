@@ -0,0 +1,174 @@
+import asyncio
+import hashlib
+import math
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import WEATHER_FALLBACKS
+from app.services.resilience import tracked
+
+class RateLimiter:
+    """Token bucket por provedor/chave de API, compartilhado entre workers
+
+    O estado fica num arquivo SQLite local: cada retirada de token roda numa
+    transação ``BEGIN IMMEDIATE``, que serializa os processos do mesmo
+    host. Cada bucket tem reposição contínua (limite por minuto) e uma cota
+    diária zerada à meia-noite UTC.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.limits: Dict[str, Tuple[int, int]] = {}
+        self._local = threading.local()
+        self._stats = {"acquired": 0, "waited": 0, "denied": 0}
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                " name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL,"
+                " day TEXT NOT NULL, day_count INTEGER NOT NULL)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def configure(self, name: str, per_minute: int, per_day: int):
+        """Define os limites de um bucket (0 = sem limite)"""
+        self.limits[name] = (per_minute, per_day)
+
+    def try_acquire(self, name: str, cost: int = 1) -> float:
+        """Retira ``cost`` tokens; devolve 0 se conseguiu ou quantos segundos esperar
+
+        Retorna ``inf`` quando a cota diária acabou.
+        """
+        per_minute, per_day = self.limits.get(name, (0, 0))
+        if not per_minute and not per_day:
+            return 0.0
+        
+        now = time.time()
+        today = datetime.now(timezone.utc).date().isoformat()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated, day, day_count FROM buckets WHERE name = ?", (name,)).fetchone()
+            tokens, updated, day, day_count = row or (float(per_minute), now, today, 0)
+            if day != today:
+                day, day_count = today, 0
+            if per_minute:
+                tokens = min(float(per_minute), tokens + (now - updated) * per_minute / 60)
+            
+            if per_day and day_count + cost > per_day:
+                wait = math.inf
+            elif per_minute and tokens < cost:
+                wait = (cost - tokens) * 60 / per_minute
+            else:
+                wait = 0.0
+                tokens -= cost if per_minute else 0
+                day_count += cost
+            
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (name, tokens, updated, day, day_count) VALUES (?, ?, ?, ?, ?)",
+                (name, tokens, now, day, day_count)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+    async def acquire(self, name: str, cost: int = 1, max_wait: Optional[float] = None) -> bool:
+        """Aguarda os tokens por até ``max_wait`` segundos"""
+        max_wait = settings.RATE_LIMIT_MAX_WAIT if max_wait is None else max_wait
+        expires = time.monotonic() + max_wait
+        waited = False
+        while True:
+            try:
+                wait = await asyncio.to_thread(self.try_acquire, name, cost)
+            except Exception as e:
+                # Estado indisponível não deve derrubar as consultas
+                print(f"  Rate limit indisponível ({name}): {e}")
+                return True
+            if wait == 0:
+                self._stats["acquired"] += 1
+                self._stats["waited"] += int(waited)
+                return True
+            if time.monotonic() + wait > expires:
+                self._stats["denied"] += 1
+                WEATHER_FALLBACKS.inc(reason="rate_limited")
+                print(f"  Limite de chamadas atingido para {name}")
+                return False
+            waited = True
+            await asyncio.sleep(wait)
+
+    def available(self, name: str) -> bool:
+        """Se há ao menos um token agora (sem consumir)"""
+        bucket = self.usage()["buckets"].get(name)
+        if not bucket:
+            return True
+        if bucket["per_day"] and bucket["used_today"] >= bucket["per_day"]:
+            return False
+        return bucket["available"] is None or bucket["available"] >= 1
+
+    def usage(self) -> Dict[str, Any]:
+        """Uso atual de cada bucket configurado (para o /health)"""
+        try:
+            rows = {
+                row[0]: row[1:]
+                for row in self._connection().execute("SELECT name, tokens, updated, day, day_count FROM buckets")
+            }
+        except Exception as e:
+            return {**self._stats, "error": str(e), "buckets": {}}
+        
+        now = time.time()
+        today = datetime.now(timezone.utc).date().isoformat()
+        usage = {}
+        for name, (per_minute, per_day) in self.limits.items():
+            tokens, updated, day, day_count = rows.get(name, (float(per_minute), now, today, 0))
+            usage[name] = {
+                "per_minute": per_minute,
+                "per_day": per_day,
+                "available": round(min(float(per_minute), tokens + (now - updated) * per_minute / 60), 2) if per_minute else None,
+                "used_today": day_count if day == today else 0
+            }
+        return {**self._stats, "buckets": usage}
+
+def bucket_name(provider: str, api_key: str = "") -> str:
+    """Bucket por provedor e chave (a chave entra só como hash)"""
+    if not api_key:
+        return provider
+    return f"{provider}:{hashlib.sha256(api_key.encode()).hexdigest()[:8]}"
+
+rate_limiter = RateLimiter(settings.RATE_LIMIT_STATE_PATH or os.path.join(tempfile.gettempdir(), "climatrends_ratelimit.sqlite3"))
+
+async def acquire(name: str, cost: int = 1) -> bool:
+    return not settings.RATE_LIMIT_ENABLED or await rate_limiter.acquire(name, cost)
+
+async def exhausted(name: str) -> bool:
+    """Se o bucket está sem tokens (consulta fora do event loop)"""
+    return settings.RATE_LIMIT_ENABLED and not await asyncio.to_thread(rate_limiter.available, name)
+
+def limited(name: str, fetcher):
+    """Envolve a chamada ao provedor: sem token disponível a chamada não sai (None)"""
+    async def call():
+        if not await acquire(name):
+            return None
+        return await fetcher()
+    return call
+
+def guarded(provider: str, bucket: str, fetcher):
+    """Chamada ao provedor com rate limit e circuit breaker, nessa ordem
+
+    O token vem antes: a chamada de teste do circuito meio-aberto só é
+    reservada depois que o token foi obtido, então uma negativa do rate
+    limit nunca deixa o circuito preso esperando um teste que não sai.
+    """
+    return limited(bucket, tracked(provider, fetcher))
@@ -0,0 +1,230 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.metrics import PROVIDER_REQUEST_DURATION, WEATHER_FALLBACKS, record_stage
+
+Fetcher = Callable[[], Awaitable[Optional[Dict[str, Any]]]]
+
+# Respostas que significam "cidade não encontrada", não falha do provedor
+NOT_FOUND_STATUS = (400, 404)
+
+class ProviderError(Exception):
+    """Falha do provedor (status de erro, cota, chave inválida): conta para o circuit breaker"""
+
+class ProviderHealth:
+    """Circuit breaker e histórico de latência de um provedor
+
+    Depois de ``failure_threshold`` falhas seguidas o circuito abre e o
+    provedor é pulado durante ``cooldown`` segundos. Passado esse tempo uma
+    única chamada de teste é liberada (meio-aberto): sucesso fecha o
+    circuito, falha abre de novo.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, cooldown: float, window: int):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.latencies: deque = deque(maxlen=window)
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+        self._stats = {"successes": 0, "errors": 0, "rejected": 0, "opened": 0}
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    def available(self) -> bool:
+        """Se vale tentar o provedor agora, sem reservar a chamada de teste
+
+        Usado antes do cache: a chamada de teste do meio-aberto só é
+        reservada (allow) por quem de fato vai à rede.
+        """
+        state = self.state
+        if state == "closed" or (state == "half_open" and not self.probing):
+            return True
+        self._stats["rejected"] += 1
+        return False
+
+    def allow(self) -> bool:
+        """Se uma chamada ao provedor pode ser feita agora (reserva a de teste)"""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.probing:
+            self.probing = True
+            return True
+        self._stats["rejected"] += 1
+        return False
+
+    def record_success(self, latency: float):
+        self.latencies.append(latency)
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self._stats["successes"] += 1
+
+    def record_failure(self):
+        self.failures += 1
+        self._stats["errors"] += 1
+        if self.probing or self.failures >= self.failure_threshold:
+            if self.opened_at is None or self.probing:
+                self._stats["opened"] += 1
+            self.opened_at = time.monotonic()
+        self.probing = False
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Percentil da latência (None enquanto há poucas amostras)"""
+        if len(self.latencies) < settings.PROVIDER_MIN_SAMPLES:
+            return None
+        return float(np.percentile(np.fromiter(self.latencies, dtype=float), q))
+
+    def stats(self) -> Dict[str, Any]:
+        p50, p95 = self.percentile(50), self.percentile(95)
+        return {
+            **self._stats,
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "samples": len(self.latencies),
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None
+        }
+
+_providers: Dict[str, ProviderHealth] = {}
+
+def provider_health(name: str) -> ProviderHealth:
+    """Estado do provedor (criado na primeira chamada)"""
+    if name not in _providers:
+        _providers[name] = ProviderHealth(
+            name,
+            failure_threshold=settings.BREAKER_FAILURE_THRESHOLD,
+            cooldown=settings.BREAKER_COOLDOWN,
+            window=settings.PROVIDER_LATENCY_WINDOW
+        )
+    return _providers[name]
+
+def providers_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: health.stats() for name, health in _providers.items()}
+
+def is_success(result: Optional[Dict[str, Any]]) -> bool:
+    return bool(result) and not result.get("error")
+
+def tracked(name: str, fetcher: Fetcher) -> Fetcher:
+    """Envolve a chamada real ao provedor, medindo latência e falhas
+
+    O fetcher devolve None para "não encontrado" e levanta exceção para
+    falhas do provedor; só as exceções contam para o circuit breaker.
+
+    O circuit breaker é consultado aqui, imediatamente antes da rede: a
+    chamada de teste do meio-aberto só é reservada por quem vai fazê-la e
+    sempre é liberada pelo resultado (ou pelo cancelamento).
+    """
+    async def call():
+        health = provider_health(name)
+        probe = health.state == "half_open"
+        if not health.allow():
+            print(f"  {name} com circuito aberto, pulando")
+            WEATHER_FALLBACKS.inc(reason="circuit_open")
+            return None
+        started = time.monotonic()
+        try:
+            result = await fetcher()
+        except asyncio.CancelledError:
+            if probe:
+                health.probing = False
+            raise
+        except Exception as e:
+            # Rede, timeout ou ProviderError: o provedor não respondeu direito
+            health.record_failure()
+            PROVIDER_REQUEST_DURATION.observe(time.monotonic() - started, provider=name, outcome="exception")
+            print(f"  {name} falhou: {e}")
+            raise
+        elapsed = time.monotonic() - started
+        # None é "não encontrado": o provedor respondeu, então não é falha
+        if result is None or is_success(result):
+            health.record_success(elapsed)
+            outcome = "ok" if result is not None else "not_found"
+        else:
+            health.record_failure()
+            outcome = "error"
+        PROVIDER_REQUEST_DURATION.observe(elapsed, provider=name, outcome=outcome)
+        record_stage(f"provider:{name}", elapsed)
+        return result
+    return call
+
+def order_providers(names: List[str]) -> List[str]:
+    """Ordena pela latência mediana; provedores sem histórico vão depois, na ordem original"""
+    def key(item):
+        index, name = item
+        p50 = provider_health(name).percentile(50)
+        return (p50 if p50 is not None else float("inf"), index)
+    return [name for _, name in sorted(enumerate(names), key=key)]
+
+def hedge_delay(name: str) -> float:
+    """Espera antes de disparar o próximo provedor: p95 do atual"""
+    p95 = provider_health(name).percentile(95)
+    if p95 is None:
+        return settings.PROVIDER_HEDGE_DEFAULT_DELAY
+    return max(p95, settings.PROVIDER_HEDGE_MIN_DELAY)
+
+async def first_success(
+    calls: List[Tuple[str, Fetcher]],
+    deadline: Optional[float] = None,
+    hedging: Optional[bool] = None
+) -> Optional[Dict[str, Any]]:
+    """Primeiro resultado válido de uma lista de provedores
+
+    Os provedores são tentados na ordem dada. Uma falha dispara o próximo
+    na hora; com hedging, o próximo também é disparado se o atual passar do
+    seu p95 sem responder. O que sobrar é cancelado ao fim do prazo.
+    """
+    deadline = settings.PROVIDER_DEADLINE if deadline is None else deadline
+    hedging = settings.PROVIDER_HEDGING if hedging is None else hedging
+    expires = time.monotonic() + deadline
+    queue = list(calls)
+    running: Dict[asyncio.Task, str] = {}
+    
+    def launch():
+        name, fetcher = queue.pop(0)
+        running[asyncio.ensure_future(fetcher())] = name
+        return name
+    
+    try:
+        current = launch()
+        while running:
+            remaining = expires - time.monotonic()
+            if remaining <= 0:
+                print(f"  Prazo de {deadline}s esgotado ({', '.join(running.values())})")
+                WEATHER_FALLBACKS.inc(reason="deadline")
+                return None
+            
+            timeout = min(remaining, hedge_delay(current)) if hedging and queue else remaining
+            done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            
+            if not done:
+                if hedging and queue:
+                    print(f"  {current} lento, disparando {queue[0][0]} em paralelo")
+                    current = launch()
+                continue
+            
+            for task in done:
+                running.pop(task)
+                result = None if task.exception() else task.result()
+                if is_success(result):
+                    return result
+            # Falhou: o próximo provedor entra sem esperar o atraso do hedge
+            if queue:
+                current = launch()
+        return None
+    finally:
+        for task in running:
+            task.cancel()
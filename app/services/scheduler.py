@@ -0,0 +1,79 @@
+import asyncio
+import random
+from typing import List, Optional
+
+from app.core.config import settings
+from app.database.writer import weather_writer
+from app.services.providers import get_weather_data
+
+class IngestionScheduler:
+    """Coleta periódica das cidades monitoradas
+
+    A cada ``interval`` segundos busca todas as cidades com no máximo
+    ``concurrency`` chamadas simultâneas (cada uma atrasada por um jitter
+    aleatório para não disparar tudo no mesmo instante) e grava as
+    observações em lote pelo ``weather_writer``.
+    """
+
+    def __init__(self, cities: List[str], interval: float, concurrency: int = 10, jitter: float = 0):
+        self.cities = cities
+        self.interval = interval
+        self.concurrency = concurrency
+        self.jitter = jitter
+        self._task: Optional[asyncio.Task] = None
+        self.last_run = None
+        self.last_saved = 0
+
+    def start(self):
+        if self.cities and self._task is None:
+            self._task = asyncio.create_task(self._loop())
+            print(f" Ingestão agendada: {len(self.cities)} cidades a cada {self.interval}s")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                print(f"  Ingestão falhou: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self) -> int:
+        semaphore = asyncio.Semaphore(self.concurrency)
+        
+        async def fetch(city):
+            if self.jitter:
+                await asyncio.sleep(random.uniform(0, self.jitter))
+            async with semaphore:
+                return await get_weather_data(city)
+        
+        results = await asyncio.gather(*[fetch(city) for city in self.cities], return_exceptions=True)
+        observations = [r for r in results if isinstance(r, dict) and not r.get("error")]
+        
+        # Conta só as linhas novas (observações repetidas são ignoradas na gravação)
+        written = weather_writer.written
+        weather_writer.submit_many(observations)
+        await weather_writer.flush()
+        saved = weather_writer.written - written
+        self.last_run = asyncio.get_running_loop().time()
+        self.last_saved = saved
+        print(f" Ingestão: {len(observations)}/{len(self.cities)} cidades coletadas, {saved} observações novas")
+        return saved
+
+def tracked_cities() -> List[str]:
+    return [city.strip() for city in settings.TRACKED_CITIES.split(",") if city.strip()]
+
+ingestion_scheduler = IngestionScheduler(
+    cities=tracked_cities(),
+    interval=settings.INGESTION_INTERVAL,
+    concurrency=settings.INGESTION_CONCURRENCY,
+    jitter=settings.INGESTION_JITTER
+)
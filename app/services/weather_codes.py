@@ -0,0 +1,36 @@
+from datetime import datetime, timedelta, timezone
+
+# Tabelas e conversões do Open-Meteo sem dependências da aplicação
+# (usadas pelos provedores e pela carga de histórico em scripts/backfill.py)
+
+# Mapear weather_code para descrição
+WEATHER_CODES = {
+    0: "Céu limpo", 1: "Poucas nuvens", 2: "Parcialmente nublado",
+    3: "Nublado", 45: "Nevoeiro", 48: "Nevoeiro com geada",
+    51: "Chuvisco leve", 53: "Chuvisco moderado", 55: "Chuvisco forte",
+    61: "Chuva leve", 63: "Chuva moderada", 65: "Chuva forte",
+    71: "Neve leve", 73: "Neve moderada", 75: "Neve forte",
+    80: "Pancadas de chuva leves", 81: "Pancadas de chuva fortes",
+    95: "Tempestade", 96: "Tempestade com granizo leve",
+    99: "Tempestade com granizo forte"
+}
+
+def get_icon_from_code(code: int) -> str:
+    """Converte código de clima para ícone"""
+    icon_map = {
+        0: "01d", 1: "02d", 2: "03d", 3: "04d",
+        45: "50d", 48: "50d",
+        51: "09d", 53: "09d", 55: "09d",
+        61: "10d", 63: "10d", 65: "10d",
+        71: "13d", 73: "13d", 75: "13d",
+        80: "09d", 81: "09d",
+        95: "11d", 96: "11d", 99: "11d"
+    }
+    return icon_map.get(code, "01d")
+
+def parse_openmeteo_time(value, utc_offset_seconds: int = 0):
+    """Horário local do Open-Meteo ("2024-01-01T12:00") para UTC"""
+    if not value:
+        return None
+    local = datetime.fromisoformat(value)
+    return (local - timedelta(seconds=utc_offset_seconds or 0)).replace(tzinfo=timezone.utc)
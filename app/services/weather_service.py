@@ -1,50 +1,83 @@
-import requests
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Optional, Dict, Any
 from app.core.config import settings
+from app.services.http_client import get_http_client
+from app.services.cache import weather_cache, weather_cache_key
+from app.services.resilience import NOT_FOUND_STATUS, ProviderError, first_success, provider_health
+from app.services.rate_limit import bucket_name, exhausted, guarded, rate_limiter
+from app.core.metrics import WEATHER_FALLBACKS
 
 class WeatherService:
     def __init__(self):
-        self.base_url = "https://api.openweathermap.org/data/2.5"
+        self.base_url = settings.OPENWEATHER_URL
         self.api_key = settings.OPENWEATHER_API_KEY
+        self.bucket = bucket_name("openweathermap", self.api_key)
+        if self.api_key and self.api_key != "test_key":
+            rate_limiter.configure(self.bucket, settings.OPENWEATHER_RATE_PER_MINUTE, settings.OPENWEATHER_RATE_PER_DAY)
     
-    def get_current_weather(self, city: str, country_code: Optional[str] = None) -> Dict[str, Any]:
+    async def get_current_weather(self, city: str, country_code: Optional[str] = None) -> Dict[str, Any]:
         if not self.api_key or self.api_key == "test_key":
             return self._get_mock_data(city, country_code)
         
-        try:
-            location = f"{city},{country_code}" if country_code else city
-            
-            response = requests.get(
-                f"{self.base_url}/weather",
-                params={
-                    "q": location,
-                    "appid": self.api_key,
-                    "units": "metric",
-                    "lang": "pt_br"
-                },
-                timeout=10
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            return {
-                "city": data.get("name", ""),
-                "country": data.get("sys", {}).get("country", ""),
-                "temperature": data.get("main", {}).get("temp", 0),
-                "feels_like": data.get("main", {}).get("feels_like", 0),
-                "humidity": data.get("main", {}).get("humidity", 0),
-                "pressure": data.get("main", {}).get("pressure", 0),
-                "wind_speed": data.get("wind", {}).get("speed", 0),
-                "description": data.get("weather", [{}])[0].get("description", ""),
-                "weather_icon": data.get("weather", [{}])[0].get("icon", ""),
-                "api_timestamp": datetime.fromtimestamp(data.get("dt", 0)),
-                "source": "openweathermap"
-            }
-            
-        except Exception as e:
-            print(f"Erro: {e}")
-            return self._get_mock_data(city, country_code)
+        key = weather_cache_key(city, country_code, "openweathermap")
+        fetcher = guarded("openweathermap", self.bucket, lambda: self._fetch_current_weather(city, country_code))
+        
+        async def call():
+            cached = await weather_cache.get(key, count_miss=False)
+            if cached is not None:
+                return cached
+            if not provider_health("openweathermap").available():
+                WEATHER_FALLBACKS.inc(reason="circuit_open")
+                return None
+            result = await weather_cache.get_or_fetch(key, fetcher)
+            if result is None and await exhausted(self.bucket):
+                result = await weather_cache.peek(key)
+                if result is not None:
+                    WEATHER_FALLBACKS.inc(reason="stale_cache")
+            return result
+        
+        # Mesmo circuit breaker e prazo total do restante da aplicação
+        data = await first_success([("openweathermap", call)])
+        if data:
+            return data
+        WEATHER_FALLBACKS.inc(reason="mock_data")
+        return self._get_mock_data(city, country_code)
+    
+    async def _fetch_current_weather(self, city: str, country_code: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """None se a cidade não existe; falhas do provedor levantam exceção"""
+        location = f"{city},{country_code}" if country_code else city
+        
+        response = await get_http_client().get(
+            f"{self.base_url}/weather",
+            params={
+                "q": location,
+                "appid": self.api_key,
+                "units": "metric",
+                "lang": "pt_br"
+            },
+            timeout=10
+        )
+        if response.status_code in NOT_FOUND_STATUS:
+            return None
+        if response.status_code != 200:
+            raise ProviderError(f"OpenWeather erro {response.status_code}")
+        data = response.json()
+        
+        return {
+            "city": data.get("name", ""),
+            "country": data.get("sys", {}).get("country", ""),
+            "latitude": data.get("coord", {}).get("lat"),
+            "longitude": data.get("coord", {}).get("lon"),
+            "temperature": data.get("main", {}).get("temp", 0),
+            "feels_like": data.get("main", {}).get("feels_like", 0),
+            "humidity": data.get("main", {}).get("humidity", 0),
+            "pressure": data.get("main", {}).get("pressure", 0),
+            "wind_speed": data.get("wind", {}).get("speed", 0),
+            "description": data.get("weather", [{}])[0].get("description", ""),
+            "weather_icon": data.get("weather", [{}])[0].get("icon", ""),
+            "api_timestamp": datetime.fromtimestamp(data.get("dt", 0), tz=timezone.utc),
+            "source": "openweathermap"
+        }
     
     def _get_mock_data(self, city: str, country_code: Optional[str] = None) -> Dict[str, Any]:
         return {
@@ -57,7 +90,7 @@ class WeatherService:
             "wind_speed": 5.2,
             "description": "céu limpo",
             "weather_icon": "01d",
-            "api_timestamp": datetime.utcnow(),
+            "api_timestamp": datetime.now(timezone.utc),
             "source": "mock_data"
         }
 
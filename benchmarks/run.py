@@ -0,0 +1,282 @@
+"""Benchmark de carga do ClimaTrends com provedores simulados
+
+Sobe o stub dos provedores (benchmarks/stub_providers.py), prepara um banco
+local com histórico, inicia a aplicação com uvicorn apontando para o stub e
+mede cada endpoint com concorrência fixa. O resultado (vazão, p50/p95/p99 e
+chamadas aos provedores por cenário) é salvo em JSON para comparar execuções.
+
+Exemplos:
+    python benchmarks/run.py --duration 20 --concurrency 50
+    python benchmarks/run.py --stub-error-rate 0.2 --label provedores-instaveis
+    python benchmarks/run.py --compare benchmarks/results/<anterior>.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+import httpx
+import numpy as np
+
+ENDPOINTS = {
+    "dashboard": lambda city: f"/dashboard?city={city}",
+    "weather": lambda city: f"/api/weather?city={city}",
+    "current": lambda city: f"/api/weather/current?city={city}",
+    "history": lambda city: f"/api/weather/history?city={city}&match=exact&limit=50"
+}
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark de carga do ClimaTrends")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help="Cenários separados por vírgula")
+    parser.add_argument("--concurrency", type=int, default=20, help="Requisições simultâneas")
+    parser.add_argument("--duration", type=float, default=15.0, help="Segundos medidos por cenário")
+    parser.add_argument("--warmup", type=float, default=3.0, help="Segundos descartados no início de cada cenário")
+    parser.add_argument("--cities", type=int, default=50, help="Cidades distintas usadas nas requisições")
+    parser.add_argument("--seed-days", type=int, default=7, help="Dias de histórico gravados antes da medição")
+    parser.add_argument("--workers", type=int, default=1, help="Workers do uvicorn")
+    parser.add_argument("--database-url", default=None, help="Banco usado (padrão: SQLite temporário)")
+    parser.add_argument("--cache-backend", default="memory", help="CACHE_BACKEND da aplicação")
+    parser.add_argument("--stub-latency-ms", type=float, default=50)
+    parser.add_argument("--stub-jitter-ms", type=float, default=20)
+    parser.add_argument("--stub-error-rate", type=float, default=0.0)
+    parser.add_argument("--stub-rate-limit-rps", type=float, default=0.0)
+    parser.add_argument("--stub-fail", default="", help="Provedores fora do ar: openweather,geocoding,forecast")
+    parser.add_argument("--label", default="", help="Nome livre da execução")
+    parser.add_argument("--output", default=None, help="Arquivo JSON de saída (padrão: benchmarks/results/)")
+    parser.add_argument("--compare", default=None, help="JSON de uma execução anterior para comparar")
+    return parser.parse_args()
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except Exception:
+        return ""
+
+def city_names(count: int):
+    return [f"Bench City {i:03d}" for i in range(count)]
+
+def seed_database(cities, days: int):
+    """Cria as tabelas e grava ``days`` dias de observações (a cada 10 minutos)"""
+    from app.database import crud
+    from app.database.session import Base, SessionLocal, engine
+    
+    Base.metadata.create_all(bind=engine)
+    if days <= 0:
+        return 0
+    end = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+    end -= timedelta(minutes=end.minute % 10)
+    steps = days * 24 * 6
+    rng = random.Random(42)
+    db = SessionLocal()
+    try:
+        total = 0
+        for city in cities:
+            rows = [{
+                "city": city,
+                "country": "XX",
+                "temperature": round(20 + 8 * np.sin(i / 72) + rng.uniform(-1, 1), 2),
+                "feels_like": 21.0,
+                "humidity": rng.randint(30, 90),
+                "pressure": rng.randint(995, 1030),
+                "wind_speed": round(rng.uniform(0, 10), 1),
+                "description": "céu limpo",
+                "icon": "01d",
+                "observed_at": end - timedelta(minutes=10 * i)
+            } for i in range(steps)]
+            total += crud.create_weather_records(db, rows)
+        return total
+    finally:
+        db.close()
+
+def start_process(args, env, log_path):
+    log = open(log_path, "w")
+    return subprocess.Popen(args, cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+def wait_ready(url: str, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=2).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Serviço não respondeu: {url}")
+
+def summarize(latencies, statuses: Counter, duration: float, upstream: dict) -> dict:
+    values = np.asarray(latencies, dtype=float) * 1000
+    ok = sum(count for status, count in statuses.items() if isinstance(status, int) and status < 400)
+    requests = int(sum(statuses.values()))
+    summary = {
+        "requests": requests,
+        "errors": requests - ok,
+        "status": {str(status): count for status, count in sorted(statuses.items(), key=lambda item: str(item[0]))},
+        "throughput_rps": round(requests / duration, 2),
+        "upstream_calls": upstream,
+        "upstream_calls_per_request": round(sum(upstream.values()) / requests, 4) if requests else None
+    }
+    if len(values):
+        summary.update({
+            "mean_ms": round(float(values.mean()), 2),
+            "p50_ms": round(float(np.percentile(values, 50)), 2),
+            "p95_ms": round(float(np.percentile(values, 95)), 2),
+            "p99_ms": round(float(np.percentile(values, 99)), 2),
+            "max_ms": round(float(values.max()), 2)
+        })
+    return summary
+
+async def run_scenario(base_url: str, stub_url: str, name: str, cities, concurrency: int, duration: float, warmup: float) -> dict:
+    """Carga em laço fechado: cada worker dispara a próxima requisição ao receber a anterior"""
+    make_path = ENDPOINTS[name]
+    latencies, statuses = [], Counter()
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    
+    async with httpx.AsyncClient(base_url=base_url, timeout=30, limits=limits) as client:
+        measure_from = time.monotonic() + warmup
+        stop = measure_from + duration
+        before = None
+        
+        async def worker(index: int):
+            n = index
+            while time.monotonic() < stop:
+                path = make_path(cities[n % len(cities)].replace(" ", "%20"))
+                n += concurrency
+                started = time.monotonic()
+                try:
+                    status = (await client.get(path)).status_code
+                except httpx.HTTPError as e:
+                    status = type(e).__name__
+                if started >= measure_from:
+                    latencies.append(time.monotonic() - started)
+                    statuses[status] += 1
+        
+        async def snapshot_after_warmup():
+            nonlocal before
+            await asyncio.sleep(warmup)
+            before = (await client.get(f"{stub_url}/stats")).json()
+        
+        await asyncio.gather(snapshot_after_warmup(), *[worker(i) for i in range(concurrency)])
+        after = (await client.get(f"{stub_url}/stats")).json()
+    
+    upstream = {key: after[key] - before.get(key, 0) for key in ("openweather", "geocoding", "forecast")}
+    return summarize(latencies, statuses, duration, upstream)
+
+def compare(current: dict, baseline_path: str):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nComparação com {baseline_path} ({baseline['meta'].get('label') or baseline['meta']['started_at']})")
+    print(f"{'cenário':<12}{'métrica':<16}{'anterior':>12}{'atual':>12}{'variação':>11}")
+    for name, result in current["results"].items():
+        previous = baseline["results"].get(name)
+        if not previous:
+            continue
+        for metric in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms"):
+            old, new = previous.get(metric), result.get(metric)
+            if old is None or new is None:
+                continue
+            change = f"{(new - old) / old * 100:+.1f}%" if old else "-"
+            print(f"{name:<12}{metric:<16}{old:>12.2f}{new:>12.2f}{change:>11}")
+
+def main():
+    args = parse_args()
+    endpoints = [name.strip() for name in args.endpoints.split(",") if name.strip()]
+    unknown = set(endpoints) - set(ENDPOINTS)
+    if unknown:
+        sys.exit(f"Cenários desconhecidos: {', '.join(sorted(unknown))}")
+    
+    workdir = tempfile.mkdtemp(prefix="climatrends-bench-")
+    database_url = args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    stub_port, app_port = free_port(), free_port()
+    stub_url, app_url = f"http://127.0.0.1:{stub_port}", f"http://127.0.0.1:{app_port}"
+    
+    env = {
+        **os.environ,
+        "PYTHONPATH": ROOT,
+        "DATABASE_URL": database_url,
+        "OPENWEATHER_API_KEY": "bench_key",
+        "OPENWEATHER_URL": f"{stub_url}/data/2.5",
+        "OPENMETEO_GEOCODING_URL": f"{stub_url}/v1/search",
+        "OPENMETEO_FORECAST_URL": f"{stub_url}/v1/forecast",
+        "INGESTION_ENABLED": "false",
+        "CACHE_BACKEND": args.cache_backend,
+        "RATE_LIMIT_STATE_PATH": os.path.join(workdir, "ratelimit.sqlite3"),
+        "STUB_LATENCY_MS": str(args.stub_latency_ms),
+        "STUB_JITTER_MS": str(args.stub_jitter_ms),
+        "STUB_ERROR_RATE": str(args.stub_error_rate),
+        "STUB_RATE_LIMIT_RPS": str(args.stub_rate_limit_rps),
+        "STUB_FAIL_PROVIDERS": args.stub_fail
+    }
+    os.environ["DATABASE_URL"] = database_url
+    
+    cities = city_names(args.cities)
+    print(f"Preparando banco ({database_url})...")
+    print(f"  {seed_database(cities, args.seed_days)} observações gravadas")
+    
+    processes = []
+    try:
+        uvicorn = [sys.executable, "-m", "uvicorn", "--host", "127.0.0.1", "--log-level", "warning", "--no-access-log"]
+        processes.append(start_process(uvicorn + ["benchmarks.stub_providers:app", "--port", str(stub_port)], env, os.path.join(workdir, "stub.log")))
+        wait_ready(f"{stub_url}/stats")
+        processes.append(start_process(uvicorn + ["app.main:app", "--port", str(app_port), "--workers", str(args.workers)], env, os.path.join(workdir, "app.log")))
+        wait_ready(f"{app_url}/health")
+        print(f"Aplicação em {app_url}, stub em {stub_url} (logs em {workdir})")
+        
+        results = {}
+        for name in endpoints:
+            print(f"\n> {name}: {args.concurrency} concorrentes por {args.duration}s")
+            results[name] = asyncio.run(run_scenario(
+                app_url, stub_url, name, cities, args.concurrency, args.duration, args.warmup
+            ))
+            r = results[name]
+            print(f"  {r['throughput_rps']} req/s  p50 {r.get('p50_ms')} ms  p95 {r.get('p95_ms')} ms  "
+                  f"p99 {r.get('p99_ms')} ms  erros {r['errors']}  chamadas externas {sum(r['upstream_calls'].values())}")
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+    
+    report = {
+        "meta": {
+            "label": args.label,
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": database_url.split("://")[0],
+            "args": {**vars(args), "database_url": database_url.split("://")[0]}
+        },
+        "results": results
+    }
+    output = args.output or os.path.join(
+        ROOT, "benchmarks", "results", f"{datetime.now().strftime('%Y%m%d-%H%M%S')}{'-' + args.label if args.label else ''}.json"
+    )
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\nResultados salvos em {output}")
+    
+    if args.compare:
+        compare(report, args.compare)
+
+if __name__ == "__main__":
+    main()
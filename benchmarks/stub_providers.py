@@ -0,0 +1,118 @@
+"""Servidor local que imita OpenWeather e Open-Meteo nos benchmarks
+
+Comportamento configurado por variáveis de ambiente:
+    STUB_LATENCY_MS        latência base de cada resposta (padrão 50)
+    STUB_JITTER_MS         variação aleatória somada à latência (padrão 20)
+    STUB_ERROR_RATE        fração de respostas 500 (padrão 0)
+    STUB_RATE_LIMIT_RPS    requisições/s por provedor antes de responder 429 (0 = sem limite)
+    STUB_FAIL_PROVIDERS    provedores sempre fora do ar: openweather,geocoding,forecast
+
+Uso: uvicorn benchmarks.stub_providers:app --port 9100
+"""
+import asyncio
+import hashlib
+import os
+import random
+import time
+from datetime import datetime, timezone
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+LATENCY = float(os.getenv("STUB_LATENCY_MS", "50")) / 1000
+JITTER = float(os.getenv("STUB_JITTER_MS", "20")) / 1000
+ERROR_RATE = float(os.getenv("STUB_ERROR_RATE", "0"))
+RATE_LIMIT_RPS = float(os.getenv("STUB_RATE_LIMIT_RPS", "0"))
+FAIL_PROVIDERS = {p.strip() for p in os.getenv("STUB_FAIL_PROVIDERS", "").split(",") if p.strip()}
+
+app = FastAPI(title="ClimaTrends provider stub")
+calls = {"openweather": 0, "geocoding": 0, "forecast": 0, "errors": 0, "rate_limited": 0}
+_buckets = {}
+
+def _coordinates(name: str):
+    """Coordenadas determinísticas por nome (qualquer cidade existe)"""
+    digest = hashlib.sha256(name.strip().lower().encode()).digest()
+    return round(digest[0] / 255 * 140 - 70, 4), round(digest[1] / 255 * 360 - 180, 4)
+
+def _temperature(lat: float) -> float:
+    return round(30 - abs(lat) * 0.4 + random.uniform(-2, 2), 1)
+
+def _rate_limited(provider: str) -> bool:
+    if not RATE_LIMIT_RPS:
+        return False
+    now = time.monotonic()
+    tokens, updated = _buckets.get(provider, (RATE_LIMIT_RPS, now))
+    tokens = min(RATE_LIMIT_RPS, tokens + (now - updated) * RATE_LIMIT_RPS)
+    if tokens < 1:
+        _buckets[provider] = (tokens, now)
+        return True
+    _buckets[provider] = (tokens - 1, now)
+    return False
+
+async def _simulate(provider: str):
+    """Latência, erros e 429 configurados; devolve a resposta de erro, se houver"""
+    calls[provider] += 1
+    await asyncio.sleep(max(0.0, LATENCY + random.uniform(0, JITTER)))
+    if _rate_limited(provider):
+        calls["rate_limited"] += 1
+        return JSONResponse({"cod": 429, "message": "rate limit"}, status_code=429)
+    if provider in FAIL_PROVIDERS or random.random() < ERROR_RATE:
+        calls["errors"] += 1
+        return JSONResponse({"cod": 500, "message": "stub error"}, status_code=500)
+    return None
+
+@app.get("/data/2.5/weather")
+async def openweather(q: str, units: str = "metric"):
+    error = await _simulate("openweather")
+    if error:
+        return error
+    city = q.replace("%20", " ").split(",")[0]
+    lat, lon = _coordinates(city)
+    temp = _temperature(lat)
+    return {
+        "coord": {"lat": lat, "lon": lon},
+        "name": city,
+        "dt": int(time.time()) // 600 * 600,
+        "sys": {"country": "XX"},
+        "main": {"temp": temp, "feels_like": temp + 1, "humidity": random.randint(30, 90), "pressure": random.randint(995, 1030)},
+        "wind": {"speed": round(random.uniform(0, 12), 1)},
+        "weather": [{"description": "céu limpo", "icon": "01d"}]
+    }
+
+@app.get("/v1/search")
+async def geocoding(name: str, count: int = 1):
+    error = await _simulate("geocoding")
+    if error:
+        return error
+    lat, lon = _coordinates(name)
+    return {"results": [{"name": name.strip().title(), "latitude": lat, "longitude": lon, "country_code": "XX"}]}
+
+@app.get("/v1/forecast")
+async def forecast(request: Request):
+    error = await _simulate("forecast")
+    if error:
+        return error
+    latitudes = request.query_params["latitude"].split(",")
+    now = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+    observed = now.replace(minute=now.minute // 15 * 15).strftime("%Y-%m-%dT%H:%M")
+    
+    def location(lat: str):
+        return {
+            "utc_offset_seconds": 0,
+            "current": {
+                "time": observed,
+                "temperature_2m": _temperature(float(lat)),
+                "relative_humidity_2m": random.randint(30, 90),
+                "pressure_msl": round(random.uniform(995, 1030), 1),
+                "wind_speed_10m": round(random.uniform(0, 40), 1),
+                "weather_code": random.choice([0, 1, 2, 3, 61])
+            }
+        }
+    # Como a API real: lista para várias coordenadas, objeto para uma só
+    if len(latitudes) > 1:
+        return [location(lat) for lat in latitudes]
+    return location(latitudes[0])
+
+@app.get("/stats")
+async def stats():
+    return calls
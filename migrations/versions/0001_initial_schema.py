@@ -0,0 +1,37 @@
+"""Esquema inicial (weather_records como criada pelo create_all original)
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "weather_records",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("city", sa.String(100)),
+        sa.Column("country", sa.String(10)),
+        sa.Column("temperature", sa.Float()),
+        sa.Column("feels_like", sa.Float()),
+        sa.Column("humidity", sa.Float()),
+        sa.Column("pressure", sa.Float()),
+        sa.Column("wind_speed", sa.Float()),
+        sa.Column("description", sa.String(200)),
+        sa.Column("weather_icon", sa.String(10)),
+        sa.Column("timestamp", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now())
+    )
+    op.create_index("ix_weather_records_id", "weather_records", ["id"])
+    op.create_index("ix_weather_records_city", "weather_records", ["city"])
+
+
+def downgrade():
+    op.drop_table("weather_records")
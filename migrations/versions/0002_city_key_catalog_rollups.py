@@ -0,0 +1,124 @@
+"""Chave de cidade, deduplicação, catálogo, agregados e cache de geocoding
+
+Bancos criados com create_all antes das migrações podem estar em qualquer
+ponto entre o esquema inicial e este: cada coluna, constraint, índice e
+tabela só é criado se ainda não existir.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.core.utils import normalize_city
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+TRGM_INDEX = """
+    DO $$
+    BEGIN
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+        CREATE INDEX IF NOT EXISTS ix_weather_records_city_key_trgm
+            ON weather_records USING gin (city_key gin_trgm_ops);
+    EXCEPTION WHEN OTHERS THEN
+        RAISE NOTICE 'pg_trgm unavailable: %', SQLERRM;
+    END $$;
+"""
+
+def rollup_columns():
+    columns = [
+        sa.Column("city_key", sa.String(100), primary_key=True),
+        sa.Column("country", sa.String(10), primary_key=True),
+        sa.Column("bucket", sa.DateTime(timezone=True), primary_key=True),
+        sa.Column("city", sa.String(100)),
+        sa.Column("sample_count", sa.Integer(), nullable=False)
+    ]
+    for metric in ("temperature", "humidity", "pressure", "wind_speed"):
+        columns += [
+            sa.Column(f"{metric}_min", sa.Float()),
+            sa.Column(f"{metric}_max", sa.Float()),
+            sa.Column(f"{metric}_sum", sa.Float(), nullable=False),
+            sa.Column(f"{metric}_count", sa.Integer(), nullable=False)
+        ]
+    return columns
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    tables = set(inspector.get_table_names())
+    columns = {column["name"] for column in inspector.get_columns("weather_records")}
+    uniques = {unique["name"] for unique in inspector.get_unique_constraints("weather_records")}
+    indexes = {index["name"] for index in inspector.get_indexes("weather_records")}
+    
+    if "observed_at" not in columns:
+        op.add_column("weather_records", sa.Column("observed_at", sa.DateTime(timezone=True)))
+    if "city_key" not in columns:
+        op.add_column("weather_records", sa.Column("city_key", sa.String(100)))
+        # normalize_city remove acentos, o que não dá para fazer em SQL portável
+        cities = bind.execute(sa.text("SELECT DISTINCT city FROM weather_records WHERE city IS NOT NULL")).scalars().all()
+        for city in cities:
+            bind.execute(
+                sa.text("UPDATE weather_records SET city_key = :key WHERE city = :city"),
+                {"key": normalize_city(city), "city": city}
+            )
+    if "uq_weather_records_observation" not in uniques:
+        with op.batch_alter_table("weather_records") as batch:
+            batch.create_unique_constraint("uq_weather_records_observation", ["city", "country", "observed_at"])
+    if "ix_weather_records_city_key_timestamp" not in indexes:
+        op.create_index(
+            "ix_weather_records_city_key_timestamp", "weather_records",
+            ["city_key", sa.text("timestamp DESC")],
+            postgresql_ops={"city_key": "text_pattern_ops"}
+        )
+    if bind.dialect.name == "postgresql":
+        op.execute(TRGM_INDEX)
+    
+    if "cities" not in tables:
+        op.create_table(
+            "cities",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("city_key", sa.String(100), nullable=False),
+            sa.Column("name", sa.String(100), nullable=False),
+            sa.Column("country", sa.String(10), nullable=False),
+            sa.Column("latitude", sa.Float()),
+            sa.Column("longitude", sa.Float()),
+            sa.Column("first_seen", sa.DateTime(timezone=True)),
+            sa.Column("last_seen", sa.DateTime(timezone=True)),
+            sa.Column("record_count", sa.Integer(), nullable=False),
+            sa.UniqueConstraint("city_key", "country", name="uq_cities_city_key_country")
+        )
+        op.create_index("ix_cities_id", "cities", ["id"])
+        op.create_index("ix_cities_city_key", "cities", ["city_key"], postgresql_ops={"city_key": "text_pattern_ops"})
+    
+    for table in ("weather_hourly", "weather_daily"):
+        if table not in tables:
+            op.create_table(table, *rollup_columns())
+    
+    if "geocode_cache" not in tables:
+        op.create_table(
+            "geocode_cache",
+            sa.Column("city_key", sa.String(100), primary_key=True),
+            sa.Column("name", sa.String(100)),
+            sa.Column("country", sa.String(10)),
+            sa.Column("latitude", sa.Float()),
+            sa.Column("longitude", sa.Float()),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now())
+        )
+
+
+def downgrade():
+    op.drop_table("geocode_cache")
+    op.drop_table("weather_daily")
+    op.drop_table("weather_hourly")
+    op.drop_table("cities")
+    op.execute("DROP INDEX IF EXISTS ix_weather_records_city_key_trgm")
+    op.drop_index("ix_weather_records_city_key_timestamp", table_name="weather_records")
+    with op.batch_alter_table("weather_records") as batch:
+        batch.drop_constraint("uq_weather_records_observation", type_="unique")
+        batch.drop_column("city_key")
+        batch.drop_column("observed_at")
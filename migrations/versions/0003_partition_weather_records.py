@@ -0,0 +1,140 @@
+"""Particiona weather_records por mês de timestamp (PostgreSQL)
+
+A tabela é recriada como PARTITION BY RANGE (timestamp), com uma partição
+por mês desde a observação mais antiga até PARTITION_MONTHS_AHEAD meses à
+frente e uma partição default. Toda chave única de uma tabela particionada
+precisa conter a coluna de partição, então a chave de deduplicação passa a
+ser (city, country, observed_at, timestamp) e a chave primária (id,
+timestamp); como timestamp é o próprio observed_at quando o provedor o
+informa, a deduplicação continua a mesma. Nos demais bancos só a chave
+única muda.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+from datetime import datetime, timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.core.config import settings
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+COLUMNS = (
+    "id, city, city_key, country, temperature, feels_like, humidity, pressure, "
+    "wind_speed, description, weather_icon, observed_at, timestamp, created_at"
+)
+
+TRGM_INDEX = """
+    DO $$
+    BEGIN
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+        CREATE INDEX IF NOT EXISTS ix_weather_records_city_key_trgm
+            ON weather_records USING gin (city_key gin_trgm_ops);
+    EXCEPTION WHEN OTHERS THEN
+        RAISE NOTICE 'pg_trgm unavailable: %', SQLERRM;
+    END $$;
+"""
+
+def add_months(value, months):
+    index = value.year * 12 + value.month - 1 + months
+    return value.replace(year=index // 12, month=index % 12 + 1)
+
+def create_city_key_index():
+    op.create_index(
+        "ix_weather_records_city_key_timestamp", "weather_records",
+        ["city_key", sa.text("timestamp DESC")],
+        postgresql_ops={"city_key": "text_pattern_ops"}
+    )
+
+def recreate_city_key_index():
+    # A cópia da tabela feita pelo batch (SQLite) recria o índice sem o DESC
+    op.drop_index("ix_weather_records_city_key_timestamp", table_name="weather_records")
+    create_city_key_index()
+
+def create_indexes():
+    op.create_index("ix_weather_records_id", "weather_records", ["id"])
+    op.create_index("ix_weather_records_city", "weather_records", ["city"])
+    create_city_key_index()
+    op.execute(TRGM_INDEX)
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql":
+        with op.batch_alter_table("weather_records") as batch:
+            batch.drop_constraint("uq_weather_records_observation", type_="unique")
+            batch.create_unique_constraint(
+                "uq_weather_records_observation", ["city", "country", "observed_at", "timestamp"]
+            )
+        recreate_city_key_index()
+        return
+    
+    op.execute("CREATE TABLE weather_records_partitioned (LIKE weather_records INCLUDING DEFAULTS) PARTITION BY RANGE (timestamp)")
+    # A sequência do id é reaproveitada e não pode sumir junto com a tabela antiga
+    op.execute("ALTER SEQUENCE weather_records_id_seq OWNED BY NONE")
+    
+    now = datetime.now(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    oldest = bind.execute(sa.text("SELECT min(timestamp) FROM weather_records")).scalar()
+    month = now if oldest is None else min(now, oldest.astimezone(timezone.utc).replace(
+        day=1, hour=0, minute=0, second=0, microsecond=0
+    ))
+    while month <= add_months(now, settings.PARTITION_MONTHS_AHEAD):
+        end = add_months(month, 1)
+        op.execute(
+            f"CREATE TABLE weather_records_p{month:%Y_%m} PARTITION OF weather_records_partitioned "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{end.isoformat()}')"
+        )
+        month = end
+    op.execute("CREATE TABLE weather_records_default PARTITION OF weather_records_partitioned DEFAULT")
+    
+    op.execute(
+        f"INSERT INTO weather_records_partitioned ({COLUMNS}) "
+        f"SELECT {COLUMNS.replace('timestamp,', 'COALESCE(timestamp, created_at, now()),')} FROM weather_records"
+    )
+    op.execute("DROP TABLE weather_records")
+    op.execute("ALTER TABLE weather_records_partitioned RENAME TO weather_records")
+    op.execute("ALTER TABLE weather_records ALTER COLUMN timestamp SET NOT NULL")
+    op.execute("ALTER TABLE weather_records ADD CONSTRAINT weather_records_pkey PRIMARY KEY (id, timestamp)")
+    op.create_unique_constraint(
+        "uq_weather_records_observation", "weather_records", ["city", "country", "observed_at", "timestamp"]
+    )
+    create_indexes()
+    op.execute("ALTER SEQUENCE weather_records_id_seq OWNED BY weather_records.id")
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql":
+        with op.batch_alter_table("weather_records") as batch:
+            batch.drop_constraint("uq_weather_records_observation", type_="unique")
+            batch.create_unique_constraint("uq_weather_records_observation", ["city", "country", "observed_at"])
+        recreate_city_key_index()
+        return
+    
+    op.execute("CREATE TABLE weather_records_plain (LIKE weather_records INCLUDING DEFAULTS)")
+    op.execute("ALTER TABLE weather_records_plain ALTER COLUMN timestamp DROP NOT NULL")
+    op.execute("ALTER TABLE weather_records_plain ADD CONSTRAINT weather_records_plain_pkey PRIMARY KEY (id)")
+    op.execute(
+        "ALTER TABLE weather_records_plain ADD CONSTRAINT weather_records_plain_observation "
+        "UNIQUE (city, country, observed_at)"
+    )
+    op.execute("ALTER SEQUENCE weather_records_id_seq OWNED BY NONE")
+    op.execute(
+        f"INSERT INTO weather_records_plain ({COLUMNS}) SELECT {COLUMNS} FROM weather_records "
+        f"ORDER BY id ON CONFLICT DO NOTHING"
+    )
+    op.execute("DROP TABLE weather_records")
+    op.execute("ALTER TABLE weather_records_plain RENAME TO weather_records")
+    op.execute("ALTER TABLE weather_records RENAME CONSTRAINT weather_records_plain_pkey TO weather_records_pkey")
+    op.execute(
+        "ALTER TABLE weather_records RENAME CONSTRAINT weather_records_plain_observation "
+        "TO uq_weather_records_observation"
+    )
+    create_indexes()
+    op.execute("ALTER SEQUENCE weather_records_id_seq OWNED BY weather_records.id")
@@ -0,0 +1,341 @@
+"""Carga de histórico a partir de arquivos do Open-Meteo (archive API)
+
+Lê em fluxo (JSON via ijson) arquivos CSV ou JSON, também .gz, exportados
+da archive API do Open-Meteo com dados horários, converte cada hora em uma
+observação no formato de weather_records e grava em lotes com
+crud.create_weather_records (COPY no PostgreSQL, INSERTs de várias linhas
+nos demais bancos), que já ignora observações repetidas e mantém catálogo
+e agregados em dia.
+
+A cidade vem de --city/--country ou do nome do arquivo: "Recife,BR.csv" ou
+"Sao_Paulo,BR.json" ("_" vira espaço). Cada arquivo é processado por um
+worker e o progresso fica salvo em --checkpoint-dir, por arquivo e cidade:
+rodar de novo retoma do último lote gravado (arquivos alterados recomeçam do
+início). Os agregados horários e diários são atualizados na carga; linhas
+brutas mais antigas que RAW_RETENTION_MONTHS são removidas pela próxima
+execução de scripts/retention.py, e o histórico continua nos agregados.
+
+Exemplos:
+    python scripts/backfill.py dumps/*.csv --workers 4
+    python scripts/backfill.py recife_2015_2024.json --city Recife --country BR
+"""
+import argparse
+import csv
+import gzip
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import ExitStack
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from app.database import crud, partitions, session
+from app.services.weather_codes import WEATHER_CODES, get_icon_from_code, parse_openmeteo_time
+
+# Variáveis horárias do Open-Meteo (nomes atuais e antigos) por coluna
+FIELDS = {
+    "temperature": ("temperature_2m",),
+    "feels_like": ("apparent_temperature",),
+    "humidity": ("relative_humidity_2m", "relativehumidity_2m"),
+    "pressure": ("pressure_msl", "surface_pressure"),
+    "wind_speed": ("wind_speed_10m", "windspeed_10m"),
+    "weather_code": ("weather_code", "weathercode")
+}
+
+Location = Dict[str, Any]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Carga de histórico do Open-Meteo no ClimaTrends")
+    parser.add_argument("files", nargs="+", help="Arquivos .csv/.json (opcionalmente .gz)")
+    parser.add_argument("--city", default=None, help="Cidade dos arquivos (padrão: nome do arquivo)")
+    parser.add_argument("--country", default=None, help="País dos arquivos (padrão: nome do arquivo)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Arquivos processados em paralelo")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Observações por transação")
+    parser.add_argument("--checkpoint-dir", default=os.path.join(ROOT, ".backfill"), help="Progresso salvo por arquivo")
+    parser.add_argument("--restart", action="store_true", help="Ignora checkpoints e recomeça do início")
+    return parser.parse_args()
+
+def open_text(path: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, encoding="utf-8", newline="")
+
+def open_binary(path: str):
+    return gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+
+def file_location(path: str, city: Optional[str], country: Optional[str]) -> Location:
+    name = os.path.basename(path)
+    for suffix in (".gz", ".csv", ".json"):
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+    file_city, _, file_country = name.rpartition(",") if "," in name else (name, "", "")
+    return {
+        "name": city or file_city.replace("_", " ").strip(),
+        "country": country if country is not None else file_country.strip().upper()
+    }
+
+def _number(value) -> Optional[float]:
+    if value is None or value == "" or value == "nan":
+        return None
+    return float(value)
+
+def _time(value, utc_offset_seconds: int) -> datetime:
+    # timeformat=unixtime devolve segundos em UTC; o padrão é ISO no horário local
+    if isinstance(value, (int, float)) or (isinstance(value, str) and value.isdigit()):
+        return datetime.fromtimestamp(int(value), tz=timezone.utc)
+    return parse_openmeteo_time(value, utc_offset_seconds)
+
+def _columns(names: List[str]) -> Dict[str, str]:
+    """Coluna do arquivo usada para cada campo (a primeira variante presente)"""
+    return {
+        field: next(alias for alias in aliases if alias in names)
+        for field, aliases in FIELDS.items()
+        if any(alias in names for alias in aliases)
+    }
+
+def _json_header(path: str) -> Tuple[Dict[str, Any], List[str]]:
+    """Metadados e variáveis horárias do JSON, lidos do início do arquivo
+
+    O Open-Meteo escreve latitude, utc_offset_seconds e hourly_units antes
+    dos dados; sem hourly_units as variáveis saem das chaves de "hourly".
+    """
+    import ijson
+
+    metadata, names = {}, []
+    with open_binary(path) as handle:
+        for prefix, event, value in ijson.parse(handle, use_float=True):
+            if prefix in ("latitude", "longitude", "utc_offset_seconds"):
+                metadata[prefix] = value
+            elif event == "map_key" and prefix in ("hourly_units", "hourly"):
+                names.append(value)
+            elif event == "end_map" and prefix == "hourly_units":
+                break
+    return metadata, names
+
+def read_json(path: str, location: Location) -> Iterator[Tuple[datetime, Dict[str, Any]]]:
+    """JSON da archive API lido em fluxo (ijson), sem carregar o arquivo
+
+    "hourly" traz uma lista por variável; cada lista é percorrida por um
+    leitor próprio sobre o arquivo e as horas são montadas em paralelo.
+    """
+    import ijson
+
+    metadata, names = _json_header(path)
+    location.setdefault("latitude", metadata.get("latitude"))
+    location.setdefault("longitude", metadata.get("longitude"))
+    offset = int(metadata.get("utc_offset_seconds") or 0)
+    columns = _columns(names)
+    with ExitStack() as stack:
+        def series(name):
+            return ijson.items(stack.enter_context(open_binary(path)), f"hourly.{name}.item", use_float=True)
+        readers = {field: series(name) for field, name in columns.items()}
+        for value in series("time"):
+            yield _time(value, offset), {field: next(reader, None) for field, reader in readers.items()}
+
+def read_csv(path: str, location: Location) -> Iterator[Tuple[datetime, Dict[str, Any]]]:
+    """CSV do Open-Meteo: bloco opcional de metadados e depois a seção horária
+
+    Os cabeçalhos trazem a unidade ("temperature_2m (°C)"); seções que não
+    têm temperature_2m (como a diária) são ignoradas.
+    """
+    with open_text(path) as handle:
+        yield from _read_csv_rows(handle, location)
+
+def _read_csv_rows(handle, location: Location) -> Iterator[Tuple[datetime, Dict[str, Any]]]:
+    reader = csv.reader(handle)
+    offset = 0
+    columns = None
+    for row in reader:
+        if not row:
+            columns = None
+            continue
+        if row[0] == "latitude":
+            metadata = dict(zip(row, next(reader)))
+            location.setdefault("latitude", _number(metadata.get("latitude")))
+            location.setdefault("longitude", _number(metadata.get("longitude")))
+            offset = int(_number(metadata.get("utc_offset_seconds")) or 0)
+            continue
+        if row[0] == "time":
+            names = [name.split(" (")[0] for name in row]
+            found = _columns(names)
+            columns = {field: names.index(name) for field, name in found.items()} if "temperature" in found else None
+            continue
+        if columns is not None:
+            yield _time(row[0], offset), {field: row[index] for field, index in columns.items()}
+
+def observations(path: str, location: Location) -> Iterator[Dict[str, Any]]:
+    """Observações normalizadas do arquivo, na ordem em que aparecem"""
+    reader = read_json if ".json" in os.path.basename(path) else read_csv
+    for observed_at, values in reader(path, location):
+        temperature = _number(values.get("temperature"))
+        # Horas sem medição (null no arquivo) não viram observação
+        if temperature is None:
+            yield None
+            continue
+        code = _number(values.get("weather_code"))
+        code = int(code) if code is not None else None
+        feels_like = _number(values.get("feels_like"))
+        yield {
+            "city": location["name"],
+            "country": location["country"],
+            "latitude": location.get("latitude"),
+            "longitude": location.get("longitude"),
+            "temperature": temperature,
+            "feels_like": temperature if feels_like is None else feels_like,
+            "humidity": _number(values.get("humidity")),
+            "pressure": _number(values.get("pressure")),
+            "wind_speed": _number(values.get("wind_speed")),
+            "description": WEATHER_CODES.get(code, "Desconhecido") if code is not None else None,
+            "weather_icon": get_icon_from_code(code) if code is not None else None,
+            "observed_at": observed_at
+        }
+
+def checkpoint_path(checkpoint_dir: str, path: str, location: Location) -> str:
+    # O mesmo arquivo carregado para outra cidade (--city/--country) tem progresso próprio
+    key = "\0".join((os.path.abspath(path), location["name"], location["country"]))
+    digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+    return os.path.join(checkpoint_dir, f"{digest}.json")
+
+def load_checkpoint(checkpoint_dir: str, path: str, location: Location) -> Dict[str, Any]:
+    """Progresso salvo do arquivo (vazio se não houver ou se o arquivo mudou)"""
+    stat = os.stat(path)
+    fresh = {
+        "file": os.path.abspath(path), "city": location["name"], "country": location["country"],
+        "size": stat.st_size, "mtime": stat.st_mtime, "rows": 0, "inserted": 0, "done": False
+    }
+    try:
+        with open(checkpoint_path(checkpoint_dir, path, location)) as handle:
+            saved = json.load(handle)
+    except (OSError, ValueError):
+        return fresh
+    if saved.get("size") != stat.st_size or saved.get("mtime") != stat.st_mtime:
+        return fresh
+    return saved
+
+def save_checkpoint(checkpoint_dir: str, path: str, location: Location, state: Dict[str, Any]):
+    # Grava em arquivo temporário e renomeia: um checkpoint nunca fica pela metade
+    target = checkpoint_path(checkpoint_dir, path, location)
+    with open(target + ".tmp", "w") as handle:
+        json.dump(state, handle)
+    os.replace(target + ".tmp", target)
+
+def _init_worker():
+    # Conexões herdadas do processo pai (fork) não podem ser reutilizadas
+    session.engine.dispose(close=False)
+
+def backfill_file(path: str, city: Optional[str], country: Optional[str], batch_size: int, checkpoint_dir: str) -> Dict[str, Any]:
+    """Carrega um arquivo em lotes, salvando o progresso após cada lote gravado"""
+    location = file_location(path, city, country)
+    state = load_checkpoint(checkpoint_dir, path, location)
+    if state["done"]:
+        return {"file": path, "city": location["name"], "rows": state["rows"], "inserted": 0, "skipped": True}
+
+    db = session.SessionLocal()
+    started = time.perf_counter()
+    previous = state["inserted"]
+    inserted = 0
+    oldest_partition = None
+    try:
+        position = 0
+        batch: List[Dict[str, Any]] = []
+        # Horas repetidas dentro do lote; entre lotes o banco ignora as repetidas
+        seen = set()
+
+        def flush():
+            nonlocal inserted, oldest_partition
+            if batch:
+                # Meses anteriores às partições já garantidas (PostgreSQL particionado)
+                first = partitions.month_start(min(obs["observed_at"] for obs in batch))
+                if oldest_partition is None or first < oldest_partition:
+                    partitions.ensure_partitions(db, start=first)
+                    oldest_partition = first
+                inserted += crud.create_weather_records(db, batch)
+            state.update(rows=position, inserted=previous + inserted)
+            save_checkpoint(checkpoint_dir, path, location, state)
+            batch.clear()
+            seen.clear()
+
+        for observation in observations(path, location):
+            position += 1
+            # Linhas já gravadas em uma execução anterior
+            if position <= state["rows"] or observation is None:
+                continue
+            key = observation["observed_at"]
+            if key in seen:
+                continue
+            seen.add(key)
+            batch.append(observation)
+            if len(batch) >= batch_size:
+                flush()
+                print(f"  {os.path.basename(path)}: {position} linhas lidas, {inserted} novas", flush=True)
+        flush()
+        state["done"] = True
+        save_checkpoint(checkpoint_dir, path, location, state)
+    finally:
+        db.close()
+
+    return {
+        "file": path,
+        "city": location["name"],
+        "rows": position,
+        "inserted": inserted,
+        "seconds": round(time.perf_counter() - started, 2),
+        "skipped": False
+    }
+
+def main():
+    args = parse_args()
+    if args.city and len(args.files) > 1:
+        print("Aviso: --city vale para todos os arquivos informados")
+    os.makedirs(args.checkpoint_dir, exist_ok=True)
+    if args.restart:
+        for path in args.files:
+            try:
+                os.remove(checkpoint_path(args.checkpoint_dir, path, file_location(path, args.city, args.country)))
+            except FileNotFoundError:
+                pass
+
+    workers = max(1, min(args.workers, len(args.files)))
+    if session.engine.dialect.name == "sqlite" and workers > 1:
+        # SQLite aceita um escritor por vez: workers paralelos só disputariam a trava
+        print("SQLite: usando 1 worker")
+        workers = 1
+
+    print(f"Carregando {len(args.files)} arquivo(s) com {workers} worker(s)...")
+    started = time.perf_counter()
+    total_rows = total_inserted = failures = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        futures = {
+            executor.submit(backfill_file, path, args.city, args.country, args.batch_size, args.checkpoint_dir): path
+            for path in args.files
+        }
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                failures += 1
+                print(f"  {path}: falhou ({e}); rode de novo para retomar")
+                continue
+            if result["skipped"]:
+                print(f"  {path}: já carregado para {result['city']}")
+                continue
+            total_rows += result["rows"]
+            total_inserted += result["inserted"]
+            print(f"  {path}: {result['city']}, {result['rows']} linhas, {result['inserted']} novas em {result['seconds']}s")
+
+    elapsed = time.perf_counter() - started
+    print(f"{total_inserted} observações novas de {total_rows} linhas em {elapsed:.1f}s "
+          f"({total_inserted / elapsed if elapsed else 0:.0f}/s)")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,9 +2,41 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app.database.session import engine, Base
-from app.database import models
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import exists, inspect, select
 
-print("Criando tabelas do banco de dados...")
-Base.metadata.create_all(bind=engine)
-print("Tabelas criadas!")
\ No newline at end of file
+from app.database.session import engine, SessionLocal
+from app.database import crud
+from app.database.models import City, WeatherDaily, WeatherRecord
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+config = Config(os.path.join(ROOT, "alembic.ini"))
+config.set_main_option("script_location", os.path.join(ROOT, "migrations"))
+
+# Bancos criados antes das migrações (create_all) têm ao menos o esquema
+# inicial; a 0002 completa o que faltar
+tables = inspect(engine).get_table_names()
+if "weather_records" in tables and "alembic_version" not in tables:
+    print("Esquema existente sem versão: marcando como 0001...")
+    command.stamp(config, "0001")
+
+print("Aplicando migrações do banco de dados...")
+command.upgrade(config, "head")
+print("Banco de dados atualizado!")
+
+# Catálogo e agregados são mantidos a cada gravação; só são recalculados a
+# partir das linhas brutas quando ainda estão vazios (bancos antigos). Depois
+# da retenção, recalcular apagaria o histórico que só existe neles.
+db = SessionLocal()
+try:
+    if db.execute(select(exists().where(WeatherRecord.id.is_not(None)))).scalar():
+        if not db.execute(select(exists().where(City.id.is_not(None)))).scalar():
+            print("Montando catálogo de cidades...")
+            print(f"{crud.rebuild_city_catalog(db)} cidades no catálogo")
+        if not db.execute(select(exists().where(WeatherDaily.city_key.is_not(None)))).scalar():
+            print("Calculando agregados horários e diários...")
+            print(f"{crud.rebuild_rollups(db)} observações agregadas")
+finally:
+    db.close()
@@ -0,0 +1,25 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings
+from app.database.session import SessionLocal
+from app.database import partitions
+
+# Rodar periodicamente (ex.: cron diário): cria as partições dos próximos
+# meses e remove os dados brutos e horários fora da retenção (os agregados
+# diários, atualizados a cada gravação, ficam).
+db = SessionLocal()
+try:
+    created = partitions.ensure_partitions(db)
+    print(f"Partições criadas: {', '.join(created) or 'nenhuma'}")
+    
+    print(
+        f"Aplicando retenção (brutos: {settings.RAW_RETENTION_MONTHS} meses, "
+        f"horários: {settings.HOURLY_RETENTION_DAYS} dias)..."
+    )
+    report = partitions.apply_retention(db)
+    print(f"Partições removidas: {', '.join(report['dropped_partitions']) or 'nenhuma'}")
+    print(f"{report['deleted_rows']} linhas brutas e {report['deleted_hourly']} agregados horários apagados")
+finally:
+    db.close()
@@ -0,0 +1,154 @@
+"""Backends compartilhados do cache (SQLite e Redis)
+
+O Redis é substituído por um servidor local que fala o protocolo RESP com
+os comandos usados pelo RedisBackend (GET, SET com PX, DEL e SCAN).
+"""
+import fnmatch
+import json
+import socketserver
+import threading
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+from app.services.cache import TTLCache
+from app.services.cache_backends import RedisBackend, SQLiteBackend
+
+
+class RESPHandler(socketserver.StreamRequestHandler):
+    def _command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        args = []
+        for _ in range(int(line[1:-2])):
+            size = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(size + 2)[:-2])
+        return args
+
+    @staticmethod
+    def _bulk(value):
+        return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+
+    def handle(self):
+        store = self.server.store
+        while (args := self._command()) is not None:
+            name, now = args[0].upper(), time.time()
+            with self.server.lock:
+                for key in [key for key, (_, expires_at) in store.items() if expires_at and expires_at <= now]:
+                    del store[key]
+                if name == b"GET":
+                    reply = self._bulk(store.get(args[1], (None, None))[0])
+                elif name == b"SET":
+                    expires_at = now + int(args[4]) / 1000 if len(args) > 4 and args[3].upper() == b"PX" else None
+                    store[args[1]] = (args[2], expires_at)
+                    reply = b"+OK\r\n"
+                elif name == b"DEL":
+                    reply = b":%d\r\n" % sum(store.pop(key, None) is not None for key in args[1:])
+                elif name == b"SCAN":
+                    pattern = args[args.index(b"MATCH") + 1].decode()
+                    keys = [key for key in store if fnmatch.fnmatchcase(key.decode(), pattern)]
+                    reply = b"*2\r\n" + self._bulk(b"0") + b"*%d\r\n" % len(keys) + b"".join(map(self._bulk, keys))
+                else:
+                    reply = b"-ERR comando nao suportado\r\n"
+            self.wfile.write(reply)
+
+
+class RESPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), RESPHandler)
+        self.store = {}
+        self.lock = threading.Lock()
+
+
+@pytest.fixture
+def redis_server():
+    server = RESPServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def make_backend(request, tmp_path):
+    if request.param == "sqlite":
+        path = str(tmp_path / "cache.sqlite3")
+        return lambda namespace: SQLiteBackend(path, namespace)
+    server = request.getfixturevalue("redis_server")
+    url = "redis://127.0.0.1:%d/0" % server.server_address[1]
+    return lambda namespace: RedisBackend(url, namespace)
+
+
+def test_roundtrip_preserves_values(make_backend):
+    backend = make_backend("weather")
+    observed = datetime(2024, 5, 1, 12, 30, tzinfo=timezone.utc)
+    value = {"city": "Recife", "temperature": 28.5, "observed_at": observed, "tags": ["a", "b"], "extra": None}
+    backend.set(("recife", "BR"), value, ttl=60)
+
+    cached, stored_at = backend.get(("recife", "BR"))
+    assert cached == value
+    assert cached["observed_at"].tzinfo is not None
+    assert abs(stored_at - time.time()) < 5
+    assert backend.get(("natal", "BR")) is None
+
+
+def test_values_are_stored_as_json(make_backend):
+    backend = make_backend("weather")
+    backend.set("recife", {"temperature": 28.5}, ttl=60)
+    if isinstance(backend, SQLiteBackend):
+        raw = backend._connection().execute("SELECT value FROM cache").fetchone()[0]
+    else:
+        raw = backend._redis().command("GET", backend._key("recife"))
+    assert json.loads(raw) is not None
+
+
+def test_objects_without_json_form_are_rejected(make_backend):
+    backend = make_backend("weather")
+    with pytest.raises(TypeError):
+        backend.set("recife", {"value": object()}, ttl=60)
+    assert backend.get("recife") is None
+
+
+def test_ttl_expires_entries(make_backend):
+    backend = make_backend("weather")
+    backend.set("recife", 1, ttl=0.05)
+    assert backend.get("recife") is not None
+    time.sleep(0.1)
+    assert backend.get("recife") is None
+
+
+def test_delete_and_clear_stay_in_namespace(make_backend):
+    weather, trends = make_backend("weather"), make_backend("trends")
+    weather.set_many([("recife", 1), ("natal", 2)], ttl=60)
+    trends.set("recife", 3, ttl=60)
+
+    weather.delete("natal")
+    assert weather.get("natal") is None
+    weather.clear()
+    assert weather.get("recife") is None
+    assert trends.get("recife")[0] == 3
+
+
+@pytest.mark.asyncio
+async def test_caches_share_entries_between_workers(make_backend):
+    # Dois TTLCache com backends próprios simulam dois workers do uvicorn
+    first, second = TTLCache(ttl=60), TTLCache(ttl=60)
+    first.backend, second.backend = make_backend("weather"), make_backend("weather")
+    calls = []
+
+    async def fetcher():
+        calls.append(1)
+        return {"temperature": 28.5}
+
+    assert await first.get_or_fetch("recife", fetcher) == {"temperature": 28.5}
+    assert await second.get_or_fetch("recife", fetcher) == {"temperature": 28.5}
+    assert len(calls) == 1
+
+    await second.invalidate("recife")
+    assert await first.get("recife") is None